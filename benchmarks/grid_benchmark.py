@@ -0,0 +1,158 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import platform
+import argparse
+import subprocess
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+from tcc_sumo.utils.helpers import get_logger, setup_logging, PROJECT_ROOT
+
+setup_logging()
+logger = get_logger("GridBenchmark")
+
+BENCH_DIR = Path(__file__).resolve().parent
+NETWORKS_DIR = BENCH_DIR / "networks"
+RESULTS_DIR = BENCH_DIR / "results"
+
+# Casos medidos: modo do SimulationManager e o que cada um isola no relatório de perfil
+CASES = {
+    "static": {"mode": "STATIC", "config": {}},
+    "adaptive": {"mode": "ADAPTIVE", "config": {}},
+    # Só o coletor de estatísticas: controlador nativo instala o plano uma vez e não age por passo
+    "stats": {"mode": "STATIC", "config": {"static_engine": "native"}},
+}
+
+def sumo_bin(name):
+    home = os.environ.get('SUMO_HOME')
+    if home and (Path(home) / "bin" / name).exists(): return str(Path(home) / "bin" / name)
+    return name
+
+def grid_side(signals):
+    # Grade N x N com todos os cruzamentos semaforizados: N = ceil(sqrt(sinais))
+    return max(2, math.ceil(math.sqrt(signals)))
+
+def build_grid(signals, rate, steps, seed):
+    """Gera (uma vez) rede N x N com semáforos, rotas aleatórias e .sumocfg determinísticos; retorna o .sumocfg."""
+    n = grid_side(signals)
+    out = NETWORKS_DIR / f"grid{n}x{n}_r{rate:g}_t{steps}_s{seed}"
+    cfg = out / "grid.sumocfg"
+    if cfg.exists(): return cfg
+    out.mkdir(parents=True, exist_ok=True)
+    net, routes = out / "grid.net.xml", out / "grid.rou.xml"
+
+    subprocess.run([sumo_bin("netgenerate"), "--grid", "--grid.number", str(n), "--grid.length", "200",
+                    "--default-junction-type", "traffic_light", "--tls.guess", "true", "--seed", str(seed),
+                    "-o", str(net)], check=True, capture_output=True, text=True)
+
+    random_trips = Path(os.environ.get('SUMO_HOME', '')) / "tools" / "randomTrips.py"
+    subprocess.run([sys.executable, str(random_trips), "-n", str(net), "-r", str(routes), "-o", str(out / "grid.trips.xml"),
+                    "-b", "0", "-e", str(steps), "--insertion-rate", str(rate), "--seed", str(seed), "--validate"],
+                   check=True, capture_output=True, text=True)
+
+    cfg.write_text(f"""<configuration>
+    <input>
+        <net-file value="{net.name}"/>
+        <route-files value="{routes.name}"/>
+    </input>
+    <time>
+        <begin value="0"/>
+        <end value="{steps}"/>
+    </time>
+</configuration>
+""")
+    logger.info(f"Rede gerada: {n}x{n} ({n * n} semáforos), {rate:g} veíc/h -> {out}")
+    return cfg
+
+def run_case(case, cfg, steps, seed, base_config, out_dir):
+    from tcc_sumo.simulation.manager import SimulationManager
+
+    spec = CASES[case]
+    config = dict(base_config, headless=True, ticket_windows=[], record_series=False, live_metrics=False,
+                  device_live=False, checkpoint_interval=0, profile_sample_interval=0.5, **spec['config'])
+    random.seed(seed)
+    manager = SimulationManager(config, cfg.parent.name, spec['mode'], headless=True, output_dir=out_dir, analyze=False,
+                                sumo_args=["--seed", str(seed)], max_steps=steps, profile=True, cfg_path=cfg)
+    manager.run()
+    with open(out_dir / f"{cfg.parent.name}_profile.json") as f: report = json.load(f)
+    report.pop('samples', None)
+    return report
+
+def git_commit():
+    try: return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip()
+    except Exception: return None
+
+def sumo_version():
+    try: return subprocess.run([sumo_bin("sumo"), "--version"], capture_output=True, text=True).stdout.splitlines()[0]
+    except Exception: return None
+
+def run_suite(signals, rates, cases, steps, seed, base_config):
+    results = []
+    for count in signals:
+        for rate in rates:
+            cfg = build_grid(count, rate, steps, seed)
+            for case in cases:
+                out_dir = RESULTS_DIR / "runs" / cfg.parent.name / case
+                t0 = time.perf_counter()
+                try: report, error = run_case(case, cfg, steps, seed, base_config, out_dir), None
+                except Exception as e: report, error = {}, str(e)
+                n = grid_side(count)
+                row = {
+                    "network": cfg.parent.name, "signals": n * n, "rate": rate, "case": case,
+                    "steps_per_sec": report.get('steps_per_sec'),
+                    "traci_calls_per_step": report.get('traci_calls_per_step'),
+                    "python_peak_rss_mb": report.get('python_peak_rss_mb'),
+                    "sumo_peak_rss_mb": report.get('sumo_peak_rss_mb'),
+                    "phases": report.get('phases'),
+                    "wall_time": round(time.perf_counter() - t0, 2),
+                    "error": error
+                }
+                logger.info(f"[{row['network']}/{case}] {row['steps_per_sec']} passos/s, {row['traci_calls_per_step']} chamadas/passo")
+                results.append(row)
+    return results
+
+def compare(old_path, new_path):
+    """Razão de passos/s (novo / antigo) por rede e caso."""
+    with open(old_path) as f: old = {(r['network'], r['case']): r for r in json.load(f)['results']}
+    with open(new_path) as f: new = json.load(f)['results']
+    for r in new:
+        base = old.get((r['network'], r['case']))
+        if not base or not base['steps_per_sec'] or not r['steps_per_sec']: continue
+        ratio = r['steps_per_sec'] / base['steps_per_sec']
+        flag = "  <-- regressão" if ratio < 0.95 else ""
+        print(f"{r['network']:<32} {r['case']:<9} {base['steps_per_sec']:>10} -> {r['steps_per_sec']:>10} ({ratio:.2f}x){flag}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--signals', nargs='+', type=int, default=[10, 100, 1000, 5000], help='Semáforos aproximados por rede (grade N x N)')
+    parser.add_argument('--rates', nargs='+', type=float, default=[1800], help='Densidade de demanda (veículos/hora)')
+    parser.add_argument('--cases', nargs='+', default=list(CASES), choices=list(CASES))
+    parser.add_argument('--steps', type=int, default=900)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--compare', nargs=2, metavar=('ANTIGO', 'NOVO'), help='Compara dois arquivos de resultado')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    import yaml
+    with open(PROJECT_ROOT / 'config' / 'config.yaml') as f: base_config = yaml.safe_load(f) or {}
+    results = run_suite(args.signals, args.rates, args.cases, args.steps, args.seed, base_config)
+
+    commit = git_commit()
+    RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+    out_file = RESULTS_DIR / f"{time.strftime('%Y%m%d_%H%M%S')}_{commit or 'nogit'}.json"
+    with open(out_file, 'w') as f:
+        json.dump({
+            "commit": commit, "sumo": sumo_version(), "python": platform.python_version(), "machine": platform.machine(),
+            "steps": args.steps, "seed": args.seed, "results": results, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+        }, f, indent=4)
+    logger.info(f"Resultados: {out_file}")
+
+if __name__ == "__main__":
+    main()
@@ -15,14 +15,41 @@ def main():
     parser.add_argument('--scenario', required=True, choices=['osm', 'api'])
     parser.add_argument('--mode', required=True, choices=['STATIC', 'ADAPTIVE'])
     parser.add_argument('--target-tl-id', default=None)
+    parser.add_argument('--headless', action='store_true', help='Usa o binário sumo (sem GUI) com porta e saída próprias')
+    parser.add_argument('--port', type=int, default=None, help='Porta TraCI (headless: livre por padrão)')
+    parser.add_argument('--output-dir', default=None, help='Diretório dos tickets desta execução')
+    parser.add_argument('--resume', default=None, help='Retoma de um checkpoint (.pkl ou diretório checkpoints/)')
+    parser.add_argument('--warmup', type=int, default=None, help='Roda N passos e salva um snapshot para --branch')
+    parser.add_argument('--branch', default=None, help='Snapshot de aquecimento do qual partem os modos de --branch-modes')
+    parser.add_argument('--profile', action='store_true', help='Tempo por fase, chamadas TraCI e CPU/RSS num relatório ao lado dos tickets')
+    parser.add_argument('--record-trace', default=None, help='Grava as respostas TraCI da execução num trace (.pkl.gz)')
+    parser.add_argument('--replay-trace', default=None, help='Roda sem SUMO, servindo as respostas de um trace gravado')
+    parser.add_argument('--fidelity', default=None, choices=['micro', 'meso'], help='meso: SUMO mesoscópico (--mesosim), filas por aresta')
+    parser.add_argument('--branch-modes', nargs='+', default=['STATIC', 'ADAPTIVE'], choices=['STATIC', 'ADAPTIVE'])
     args = parser.parse_args()
 
     cfg_path = PROJECT_ROOT / 'config' / 'config.yaml'
     with open(cfg_path) as f: config = yaml.safe_load(f)
+    if args.record_trace: config['record_trace'] = args.record_trace
+    if args.fidelity: config['fidelity'] = args.fidelity
+    if args.replay_trace: config.update(backend='replay', trace_file=args.replay_trace)
 
     try:
-        manager = SimulationManager(config, args.scenario, args.mode, args.target_tl_id)
+        if args.branch:
+            # Um diretório por modo; todos partem do mesmo estado do SUMO, sem repetir o aquecimento
+            base = Path(args.output_dir) if args.output_dir else PROJECT_ROOT / 'output' / 'branches'
+            for mode in args.branch_modes:
+                manager = SimulationManager(config, args.scenario, mode, args.target_tl_id, headless=args.headless,
+                                            port=args.port, output_dir=base / mode, branch_from=args.branch,
+                                            profile=args.profile)
+                manager.run()
+            return
+        manager = SimulationManager(config, args.scenario, args.mode, args.target_tl_id,
+                                    headless=args.headless, port=args.port, output_dir=args.output_dir,
+                                    max_steps=args.warmup, resume=args.resume, final_checkpoint=args.warmup is not None,
+                                    profile=args.profile)
         manager.run()
+        if args.warmup is not None: logger.info(f"Snapshot de aquecimento: {manager.checkpoints.latest()}")
     except Exception as e:
         logger.critical(f"Erro Fatal: {e}")
         sys.exit(1)
@@ -1,6 +1,7 @@
 import os
 import json
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
 from supabase import create_client
 
@@ -37,6 +38,8 @@ def sync():
             
         print(f"Lendo {len(devices)} dispositivos do manifesto...")
         
+        # updated_at (sync por delta do DeviceRegistry) é preenchido pelo banco: default no insert, trigger no update
+        # só quando a linha muda; deleted_at nulo revive um dispositivo que voltou ao manifesto
         data_to_insert = []
         for d in devices:
             row = {
@@ -46,13 +49,18 @@ def sync():
                 "longitude": d["geo"]["lon"],
                 "status": d.get("status", "active"),
                 "sumo_id": d.get("sumo_id"),
-                "linked_mac": d.get("linked_to")
+                "linked_mac": d.get("linked_to"),
+                "deleted_at": None
             }
             data_to_insert.append(row)
 
         if data_to_insert:
             print(f"Tentando inserir {len(data_to_insert)} registros...")
             client.table("dispositivos").upsert(data_to_insert, on_conflict="mac_address").execute()
+            # Tombstone nos dispositivos que saíram do manifesto: o sync por delta dos clientes enxerga a remoção
+            macs = [row["mac_address"] for row in data_to_insert]
+            now = datetime.now(timezone.utc).isoformat()
+            client.table("dispositivos").update({"deleted_at": now}).not_.in_("mac_address", macs).is_("deleted_at", "null").execute()
             print("SUCESSO! Dados sincronizados.")
         else:
             print("Nenhum dado para inserir.")
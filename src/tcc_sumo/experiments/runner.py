@@ -0,0 +1,115 @@
+import sys
+import json
+import time
+import random
+import argparse
+import itertools
+import yaml
+import pandas as pd
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.utils.helpers import get_logger, setup_logging, format_time, PROJECT_ROOT
+
+setup_logging()
+logger = get_logger("ExperimentRunner")
+
+EXPERIMENTS_DIR = PROJECT_ROOT / "output" / "experiments"
+
+def build_matrix(scenarios, modes, seeds, scales, base_port=9000):
+    """Expande cenários × modos × sementes × escala de demanda numa lista de execuções com porta única."""
+    runs = []
+    for i, (scen, mode, seed, scale) in enumerate(itertools.product(scenarios, modes, seeds, scales)):
+        runs.append({
+            "run_id": f"{scen}_{mode}_s{seed}_x{scale:g}",
+            "scenario": scen,
+            "mode": mode.upper(),
+            "seed": seed,
+            "scale": scale,
+            "port": base_port + i
+        })
+    return runs
+
+def run_one(spec, config, out_dir):
+    # Importado no worker: cada processo tem o seu próprio estado TraCI
+    from tcc_sumo.simulation.manager import SimulationManager
+    from tcc_sumo.tools.log_analyzer import LogAnalyzer
+
+    run_dir = Path(out_dir) / spec['run_id']
+    random.seed(spec['seed'])
+    t0 = time.perf_counter()
+    tickets, metrics, error, gridlocked = [], {}, None, False
+    try:
+        manager = SimulationManager(
+            config, spec['scenario'], spec['mode'], headless=True, port=spec['port'], output_dir=run_dir,
+            sumo_args=["--seed", str(spec['seed']), "--scale", str(spec['scale'])], analyze=False,
+            ctrl_params=spec.get('ctrl_params'), max_steps=spec.get('max_steps'), branch_from=spec.get('branch_from')
+        )
+        tickets = manager.run() or []
+        error = manager.error
+        gridlocked = manager.gridlock_report is not None
+        metrics = LogAnalyzer(mode=spec['mode'], trip_info=manager.trip_info, scen_path=manager.scenario_dir).collect()
+    except Exception as e:
+        error = str(e)
+    return {"spec": spec, "tickets": tickets, "metrics": metrics, "error": error, "gridlocked": gridlocked, "wall_time": time.perf_counter() - t0}
+
+def to_rows(result):
+    """Uma linha por ticket (semáforo), com os parâmetros da execução e as métricas do LogAnalyzer."""
+    base = dict(result['spec'])
+    base.update({f"trip_{k}": v for k, v in result['metrics'].items() if k not in ('scenario', 'mode')})
+    base['wall_time'] = round(result['wall_time'], 2)
+    base['error'] = result['error']
+    base['gridlocked'] = result.get('gridlocked', False)
+    if not result['tickets']: return [base]
+    rows = []
+    for t in result['tickets']:
+        row = dict(base)
+        row.update({"sumo_id": t['sumo_id'], "tls_mac": t['tls_mac'], "camera_mac": t['camera_mac']})
+        row.update(t['metrics'])
+        rows.append(row)
+    return rows
+
+def run_matrix(runs, config, out_dir, workers=None):
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    rows = []
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_one, spec, config, str(out_dir)): spec for spec in runs}
+        for done, fut in enumerate(as_completed(futures), 1):
+            spec = futures[fut]
+            try: result = fut.result()
+            except Exception as e:
+                result = {"spec": spec, "tickets": [], "metrics": {}, "error": str(e), "wall_time": 0.0}
+            status = "ERRO" if result['error'] else ("TRAVADO" if result.get('gridlocked') else "OK")
+            logger.info(f"[{done}/{len(runs)}] {spec['run_id']}: {status} ({result['wall_time']:.1f}s)")
+            rows.extend(to_rows(result))
+
+    df = pd.DataFrame(rows)
+    df.to_csv(out_dir / "results.csv", index=False)
+    with open(out_dir / "matrix.json", 'w') as f: json.dump(runs, f, indent=4)
+    logger.info(f"{len(runs)} execuções em {format_time(time.perf_counter() - t0)}. Tabela: {out_dir / 'results.csv'}")
+    return df
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', nargs='+', default=['api'], choices=['osm', 'api'])
+    parser.add_argument('--modes', nargs='+', default=['STATIC', 'ADAPTIVE'], choices=['STATIC', 'ADAPTIVE'])
+    parser.add_argument('--seeds', nargs='+', type=int, default=[1, 2, 3])
+    parser.add_argument('--scales', nargs='+', type=float, default=[1.0])
+    parser.add_argument('--workers', type=int, default=None, help='Processos paralelos (padrão: nº de CPUs)')
+    parser.add_argument('--base-port', type=int, default=9000)
+    parser.add_argument('--name', default=time.strftime("%Y%m%d_%H%M%S"))
+    parser.add_argument('--branch', default=None, help='Snapshot de aquecimento (main.py --warmup) de onde partem todas as execuções')
+    args = parser.parse_args()
+
+    with open(PROJECT_ROOT / 'config' / 'config.yaml') as f: config = yaml.safe_load(f) or {}
+    runs = build_matrix(args.scenarios, args.modes, args.seeds, args.scales, args.base_port)
+    if args.branch:
+        for spec in runs: spec['branch_from'] = args.branch
+    logger.info(f"Matriz de experimentos: {len(runs)} execuções.")
+    run_matrix(runs, config, EXPERIMENTS_DIR / args.name, args.workers)
+
+if __name__ == "__main__":
+    main()
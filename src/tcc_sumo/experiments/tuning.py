@@ -0,0 +1,192 @@
+import sys
+import json
+import time
+import math
+import random
+import hashlib
+import argparse
+import itertools
+import yaml
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.utils.helpers import get_logger, setup_logging, format_time, PROJECT_ROOT
+from tcc_sumo.experiments.runner import run_one
+
+setup_logging()
+logger = get_logger("AdaptiveTuning")
+
+TUNING_DIR = PROJECT_ROOT / "output" / "tuning"
+SCENARIO_CFGS = {
+    'api': PROJECT_ROOT / "scenarios/from_api/api.sumocfg",
+    'osm': PROJECT_ROOT / "scenarios/from_osm/osm.sumocfg",
+}
+
+def scenario_hash(scenario):
+    """Hash do conteúdo do cenário (cfg, rede, rotas, adicionais): muda se o cenário for regenerado."""
+    cfg = SCENARIO_CFGS[scenario]
+    h = hashlib.sha256()
+    files = [cfg] + sorted(p for pat in ("*.net.xml", "*.rou.xml", "*.add.xml") for p in cfg.parent.glob(pat))
+    for fp in files:
+        if not fp.exists(): continue
+        h.update(fp.name.encode())
+        with open(fp, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''): h.update(chunk)
+    return h.hexdigest()[:16]
+
+# Chaves que não mudam o score (rede, portas, saídas, telemetria): fora do hash da configuração
+NON_SCORING_KEYS = frozenset((
+    'traci_port', 'sumo_executable', 'headless', 'output_paths', 'scenarios', 'sumo_pool', 'sumo_pool_size',
+    'sumo_pool_max_runs', 'checkpoint_interval', 'checkpoint_keep', 'profile_sample_interval', 'record_trace',
+    'live_metrics', 'live_metrics_db', 'live_metrics_host', 'live_metrics_interval', 'live_metrics_port', 'live_metrics_table',
+    'device_cache_ttl', 'device_fetch_timeout'
+))
+
+def config_hash(config):
+    """Hash da configuração efetiva da simulação (fidelity, sensing, engines, scheduler, ...): muda o score, invalida o cache."""
+    effective = {k: v for k, v in config.items() if k not in NON_SCORING_KEYS}
+    return hashlib.sha256(json.dumps(effective, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _stop_pool(pool):
+    # cancel() não interrompe jobs já em execução: encerra os workers (o SUMO de cada um cai com a conexão TraCI)
+    procs = list((pool._processes or {}).values())
+    pool.shutdown(wait=False, cancel_futures=True)
+    for p in procs: p.terminate()
+
+def sample_candidates(n, thresholds, min_times, max_times, seed=0):
+    grid = [
+        {"threshold": t, "min_time": lo, "max_time": hi}
+        for t, lo, hi in itertools.product(thresholds, min_times, max_times) if hi > lo
+    ]
+    if n and n < len(grid): grid = random.Random(seed).sample(grid, n)
+    return grid
+
+def score(result):
+    # Menor é melhor: fila média dos tickets; sem tickets, espera média das viagens concluídas
+    if result['error']: return math.inf
+    queues = [t['metrics']['avg_queue'] for t in result['tickets']]
+    if queues: return sum(queues) / len(queues)
+    return result['metrics'].get('wait', math.inf)
+
+class ResultCache:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.data = {}
+        if self.path.exists():
+            try:
+                with open(self.path) as f: self.data = json.load(f)
+            except: pass
+
+    @staticmethod
+    def key(scen_hash, cfg_hash, params, horizon, seed):
+        return f"{scen_hash}:{cfg_hash}:{params['threshold']}:{params['min_time']}:{params['max_time']}:{horizon}:{seed}"
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def put(self, key, value):
+        self.data[key] = value
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'w') as f: json.dump(self.data, f, indent=4)
+
+def tune(scenario, candidates, horizons, seed=1, eta=3, workers=None, time_budget=None, base_port=9500):
+    """Successive halving: avalia todos num horizonte curto e promove apenas o melhor 1/eta ao seguinte."""
+    deadline = time.monotonic() + time_budget if time_budget else None
+    scen_hash = scenario_hash(scenario)
+    cache = ResultCache(TUNING_DIR / "cache.json")
+    with open(PROJECT_ROOT / 'config' / 'config.yaml') as f: config = yaml.safe_load(f) or {}
+    cfg_hash = config_hash(config)
+    out_dir = TUNING_DIR / "runs" / scenario
+
+    alive = list(candidates)
+    best = None
+    port = base_port
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for rung, horizon in enumerate(horizons):
+            if deadline and time.monotonic() > deadline:
+                logger.warning(f"Orçamento de tempo esgotado antes da rodada {rung}.")
+                break
+            scored = []
+            pending = {}
+            for params in alive:
+                key = ResultCache.key(scen_hash, cfg_hash, params, horizon, seed)
+                cached = cache.get(key)
+                if cached is not None:
+                    scored.append((cached, params))
+                    continue
+                spec = {
+                    "run_id": f"tune_{scenario}_h{horizon}_t{params['threshold']}_{params['min_time']}_{params['max_time']}",
+                    "scenario": scenario, "mode": "ADAPTIVE", "seed": seed, "scale": 1.0,
+                    "port": port, "ctrl_params": params, "max_steps": horizon
+                }
+                port += 1
+                pending[pool.submit(run_one, spec, config, str(out_dir))] = (key, params)
+
+            timed_out = False
+            try:
+                # Com orçamento, o as_completed estoura no prazo mesmo com jobs ainda rodando
+                for fut in as_completed(pending, timeout=max(0.0, deadline - time.monotonic()) if deadline else None):
+                    key, params = pending[fut]
+                    try: value = score(fut.result())
+                    except Exception: value = math.inf
+                    cache.put(key, value)
+                    scored.append((value, params))
+            except FuturesTimeout:
+                timed_out = True
+                _stop_pool(pool)
+            cache.save()
+
+            scored.sort(key=lambda x: x[0])
+            if scored and math.isfinite(scored[0][0]):
+                best = {"params": scored[0][1], "score": scored[0][0], "horizon": horizon, "rung": rung}
+            logger.info(f"Rodada {rung} (horizonte {horizon}s): {len(scored)} avaliados, melhor score {scored[0][0] if scored else 'N/A'}")
+
+            if timed_out:
+                logger.warning("Orçamento de tempo esgotado: mantendo o melhor resultado da última rodada.")
+                break
+            keep = max(1, math.ceil(len(scored) / eta))
+            alive = [p for v, p in scored[:keep] if math.isfinite(v)]
+            if not alive: break
+
+    if best: best["scenario_hash"] = scen_hash
+    return best
+
+def save_best(scenario, best):
+    fp = TUNING_DIR / "best_params.json"
+    data = {}
+    if fp.exists():
+        try:
+            with open(fp) as f: data = json.load(f)
+        except: pass
+    data[scenario] = dict(best, timestamp=time.strftime("%Y-%m-%d %H:%M:%S"))
+    fp.parent.mkdir(parents=True, exist_ok=True)
+    with open(fp, 'w') as f: json.dump(data, f, indent=4)
+    logger.info(f"Melhor configuração ({scenario}): {best['params']} -> {fp}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', default='api', choices=list(SCENARIO_CFGS))
+    parser.add_argument('--thresholds', nargs='+', type=int, default=[1, 2, 3, 5, 8])
+    parser.add_argument('--min-times', nargs='+', type=int, default=[15, 30, 60, 90])
+    parser.add_argument('--max-times', nargs='+', type=int, default=[120, 300, 600])
+    parser.add_argument('--samples', type=int, default=0, help='Amostra aleatória da grade (0 = grade completa)')
+    parser.add_argument('--horizons', nargs='+', type=int, default=[900, 1800, 3600], help='Horizontes (s) de cada rodada de poda')
+    parser.add_argument('--eta', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--time-budget', type=float, default=None, help='Tempo máximo (s) da busca; jobs ainda rodando no prazo são encerrados')
+    args = parser.parse_args()
+
+    candidates = sample_candidates(args.samples, args.thresholds, args.min_times, args.max_times, args.seed)
+    logger.info(f"Busca de parâmetros [{args.scenario}]: {len(candidates)} candidatos, horizontes {args.horizons}")
+    t0 = time.perf_counter()
+    best = tune(args.scenario, candidates, sorted(args.horizons), args.seed, args.eta, args.workers, args.time_budget)
+    logger.info(f"Busca concluída em {format_time(time.perf_counter() - t0)}")
+    if best: save_best(args.scenario, best)
+    else: logger.warning("Nenhum candidato válido.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+import importlib
+
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("SumoBackend")
+
+BACKENDS = ('traci', 'libsumo', 'replay')
+
+# Ciclo de vida da conexão: não é resposta da simulação, fica fora da contagem e do trace
+LIFECYCLE = frozenset(('start', 'init', 'close', 'switch', 'getConnection', 'setOrder', 'load', 'isLibsumo', 'isLibtraci'))
+
+def _observed(key, fn, observers):
+    def call(*args, **kwargs):
+        try: result = fn(*args, **kwargs)
+        except Exception as e:
+            for obs in observers: obs(key, args, kwargs, False, e)
+            raise
+        for obs in observers: obs(key, args, kwargs, True, result)
+        return result
+    return call
+
+class _ObservedDomain:
+    """Envolve um domínio TraCI (trafficlight, lane, ...) e entrega cada chamada (domínio, método) aos observadores."""
+
+    def __init__(self, name, domain, observers):
+        self._name = name
+        self._domain = domain
+        self._observers = observers
+
+    def __getattr__(self, attr):
+        fn = getattr(self._domain, attr)
+        if not callable(fn) or isinstance(fn, type): return fn
+        return _observed((self._name, attr), fn, self._observers)
+
+class SumoBackend:
+    """Proxy para a API TraCI ativa: 'traci' (socket, suporta GUI), 'libsumo' (em processo) ou 'replay' (trace gravado)."""
+
+    def __init__(self, name: str = 'traci'):
+        self._name = name
+        self._module = None
+        self._observers = []
+        self._counter = None
+
+    def select(self, name: str, trace=None) -> None:
+        if name not in BACKENDS:
+            raise ValueError(f"Backend desconhecido: {name} (opções: {', '.join(BACKENDS)})")
+        if name == 'replay':
+            # Sem SUMO: as respostas vêm de um trace gravado com record()
+            from tcc_sumo.simulation.replay import ReplayModule
+            if trace is None: raise ValueError("O backend 'replay' exige um arquivo de trace.")
+            self._module = ReplayModule(trace)
+            self._name = name
+            logger.info(f"Backend SUMO selecionado: replay ({trace})")
+            return
+        if name == self._name and self._module is not None: return
+        self._module = importlib.import_module(name)
+        self._name = name
+        logger.info(f"Backend SUMO selecionado: {name}")
+
+    def observe(self, observer) -> None:
+        # observer(chave, args, kwargs, ok, resultado_ou_exceção) após cada chamada; a lista é trocada, nunca alterada no lugar
+        self._observers = self._observers + [observer]
+
+    def unobserve(self, observer) -> None:
+        self._observers = [o for o in self._observers if o is not observer]
+
+    def count_calls(self, counter) -> None:
+        # Counter de (domínio, método); None desliga a contagem
+        if self._counter is not None: self.unobserve(self._counter)
+        self._counter = None
+        if counter is None: return
+        def count(key, args, kwargs, ok, value): counter[key] += 1
+        self._counter = count
+        self.observe(count)
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    @property
+    def in_process(self) -> bool:
+        return self._name in ('libsumo', 'replay')
+
+    @property
+    def supports_gui(self) -> bool:
+        return not self.in_process
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'): raise AttributeError(attr)
+        # Import tardio: só exige o módulo escolhido no primeiro acesso
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        obj = getattr(self._module, attr)
+        if not self._observers or attr in LIFECYCLE: return obj
+        if isinstance(obj, type) and issubclass(obj, BaseException): return obj
+        # Funções do topo (simulationStep); domínios são objetos no traci e classes no libsumo
+        if callable(obj) and not isinstance(obj, type): return _observed(('traci', attr), obj, self._observers)
+        return _ObservedDomain(attr, obj, self._observers)
+
+traci = SumoBackend()
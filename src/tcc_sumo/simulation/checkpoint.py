@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+import pickle
+from pathlib import Path
+
+from tcc_sumo.utils.helpers import get_logger
+from tcc_sumo.simulation.backend import traci
+
+logger = get_logger("Checkpoint")
+
+class CheckpointStore:
+    """Pares (estado SUMO via saveState, estado Python em pickle) por passo; o .pkl só existe se o par está completo."""
+
+    def __init__(self, directory, keep: int = 2):
+        self.directory = Path(directory).resolve()
+        self.keep = keep
+
+    def save(self, step, payload):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        state_file = self.directory / f"step_{step:08d}.xml.gz"
+        traci.simulation.saveState(str(state_file))
+        payload = dict(payload, step=step, state_file=state_file.name)
+        tmp = self.directory / f"step_{step:08d}.pkl.tmp"
+        with open(tmp, 'wb') as f: pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        tmp.replace(self.directory / f"step_{step:08d}.pkl")
+        self._prune()
+        logger.info(f"Checkpoint salvo no passo {step}: {state_file}")
+        return self.directory / f"step_{step:08d}.pkl"
+
+    def _prune(self):
+        if not self.keep: return
+        for old in sorted(self.directory.glob("step_*.pkl"))[:-self.keep]:
+            old.unlink()
+            old.with_suffix(".xml.gz").unlink(missing_ok=True)
+
+    def latest(self):
+        found = sorted(self.directory.glob("step_*.pkl"))
+        return found[-1] if found else None
+
+def load_checkpoint(path):
+    """Aceita o .pkl ou o diretório (usa o mais recente). Retorna o payload com 'state_file' absoluto."""
+    path = Path(path).resolve()
+    if path.is_dir():
+        latest = CheckpointStore(path).latest()
+        if latest is None: raise FileNotFoundError(f"Nenhum checkpoint em {path}")
+        path = latest
+    with open(path, 'rb') as f: payload = pickle.load(f)
+    payload['state_file'] = str(path.parent / payload['state_file'])
+    return payload
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import tempfile
+import queue
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from tcc_sumo.utils.helpers import get_logger
+
+try:
+    from supabase import create_client
+    HAS_SUPABASE = True
+except ImportError:
+    HAS_SUPABASE = False
+
+logger = get_logger("DeviceStates")
+
+BASE_COLUMNS = "mac_address, status, tipo, sumo_id, linked_mac"
+# updated_at e deleted_at (tombstone) vêm das migrações supabase/migrations/*_dispositivos_{updated,deleted}_at.sql
+COLUMNS = BASE_COLUMNS + ", updated_at, deleted_at"
+
+class SupabaseDeviceSource:
+    """Linhas de 'dispositivos' lidas do Supabase; com 'since', só as alteradas depois desse updated_at.
+
+    Sem as colunas updated_at/deleted_at (migrações não aplicadas), toda leitura é completa.
+    """
+
+    def __init__(self, url: str, key: str):
+        self.url = url
+        self.key = key
+        self.has_updated_at = True
+
+    def fetch(self, since: Optional[str] = None) -> List[dict]:
+        client = create_client(self.url, self.key)
+        if self.has_updated_at:
+            query = client.from_("dispositivos").select(COLUMNS)
+            if since: query = query.gt("updated_at", since)
+            try: return query.execute().data
+            except Exception as e:
+                if 'updated_at' not in str(e) and 'deleted_at' not in str(e): raise
+                logger.warning("Colunas dispositivos.updated_at/deleted_at ausentes (aplique as migrações): sync completo a cada leitura.")
+                self.has_updated_at = False
+        return client.from_("dispositivos").select(BASE_COLUMNS).execute().data
+
+class LocalDeviceSource:
+    """Substituto offline: lê as mesmas linhas de um JSON local (lista de {mac_address, status, tipo, ...})."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+
+    def fetch(self, since: Optional[str] = None) -> List[dict]:
+        with open(self.path, 'r', encoding='utf-8') as f: rows = json.load(f)
+        if since: rows = [r for r in rows if (r.get('updated_at') or '') > since]
+        return rows
+
+class DeviceRegistry:
+    """Cópia local de 'dispositivos' indexada por MAC, sumo_id e ID de câmera, sincronizada por delta.
+
+    O cursor é o maior updated_at já visto: sync() pede só as linhas alteradas depois dele. Remoções chegam como
+    tombstones (deleted_at preenchido) e saem do registro. Sem updated_at nas linhas, cada sync volta a ser
+    completo e substitui o registro inteiro.
+    """
+
+    def __init__(self, path, ttl: float = 300):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.rows: Dict[str, dict] = {}
+        self.cursor: Optional[str] = None
+        self.synced_at: Optional[float] = None
+        self.by_sumo_id: Dict[str, str] = {}
+        self.by_camera: Dict[str, str] = {}
+
+    @property
+    def age(self) -> Optional[float]:
+        return None if self.synced_at is None else time.time() - self.synced_at
+
+    @property
+    def fresh(self) -> bool:
+        return self.age is not None and self.age <= self.ttl
+
+    def load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f: data = json.load(f)
+            self.rows = {r['mac_address']: r for r in data['rows']}
+            self.cursor, self.synced_at = data.get('cursor'), data['synced_at']
+        except (OSError, ValueError, KeyError):
+            self.rows, self.cursor, self.synced_at = {}, None, None
+        self._reindex()
+        return self
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Temporário próprio no mesmo diretório: workers paralelos salvam o mesmo registro sem se atropelar
+        with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.path.parent, prefix=f"{self.path.stem}.", suffix=".tmp", delete=False) as f:
+            json.dump({"cursor": self.cursor, "synced_at": self.synced_at, "rows": list(self.rows.values())}, f)
+        try: os.replace(f.name, self.path)
+        except OSError:
+            os.unlink(f.name)
+            raise
+
+    def sync(self, source, full: bool = False) -> List[dict]:
+        if full: self.cursor = None
+        # Sem cursor a leitura é completa: o que não veio foi removido
+        complete = self.cursor is None
+        changed = source.fetch(self.cursor)
+        if complete: self.rows = {}
+        for r in changed:
+            if r.get('deleted_at'): self.rows.pop(r['mac_address'], None)
+            else: self.rows[r['mac_address']] = r
+        stamps = [r['updated_at'] for r in changed if r.get('updated_at')]
+        if self.cursor: stamps.append(self.cursor)
+        if stamps: self.cursor = max(stamps)
+        self.synced_at = time.time()
+        self._reindex()
+        self.save()
+        return changed
+
+    def _reindex(self):
+        self.by_sumo_id = {r['sumo_id']: mac for mac, r in self.rows.items() if r.get('sumo_id')}
+        self.by_camera = {mac: r.get('linked_mac') for mac, r in self.rows.items() if r.get('tipo') == 'CAMERA'}
+
+    def get(self, mac: str) -> Optional[dict]:
+        return self.rows.get(mac)
+
+    def for_sumo_id(self, sumo_id: str) -> Optional[dict]:
+        mac = self.by_sumo_id.get(sumo_id)
+        return self.rows.get(mac) if mac else None
+
+    def camera(self, camera_id: str) -> Optional[dict]:
+        return self.rows.get(camera_id) if camera_id in self.by_camera else None
+
+    def snapshot(self) -> List[dict]:
+        return list(self.rows.values())
+
+class DeviceStatePrefetch:
+    """Sincroniza o registro numa thread enquanto o SUMO inicia; result() espera no máximo 'timeout' segundos.
+
+    Ordem de preferência: cópia local dentro do TTL (sem rede), sync concluído a tempo, cópia local vencida.
+    """
+
+    def __init__(self, source, registry: DeviceRegistry):
+        self.source = source
+        self.registry = registry.load()
+        self._stale = registry.snapshot()
+        self._thread = None
+
+    def start(self):
+        if self.registry.fresh:
+            logger.info(f"Estados de dispositivos do cache ({self.registry.age:.0f}s): {len(self._stale)} linhas.")
+            return self
+        self._thread = threading.Thread(target=self._sync, name="device-prefetch", daemon=True)
+        self._thread.start()
+        return self
+
+    def _sync(self):
+        try:
+            n = len(self.registry.sync(self.source))
+            logger.info(f"Registro de dispositivos sincronizado: {n} linhas alteradas (cursor {self.registry.cursor or '-'}).")
+        except Exception as e:
+            logger.warning(f"Falha ao sincronizar dispositivos: {e}")
+
+    def result(self, timeout: float = 2.0) -> Optional[List[dict]]:
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # A thread ainda altera o registro: usa a cópia lida antes dela
+                logger.warning(f"Sync de dispositivos não terminou em {timeout}s: usando a cópia local.")
+                return self._stale or None
+        rows = self.registry.snapshot()
+        return rows or None
+
+    def join(self):
+        if self._thread is not None: self._thread.join()
+
+class DeviceFeed:
+    """Mudanças de estado durante a execução: uma thread faz sync por delta a cada 'interval' s e enfileira as linhas.
+
+    O laço só chama drain(), que nunca bloqueia (SimpleQueue.get_nowait); toda a E/S fica na thread.
+    """
+
+    def __init__(self, source, prefetch: DeviceStatePrefetch, interval: float = 5.0):
+        self.source = source
+        self.prefetch = prefetch
+        self.interval = interval
+        self._queue = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="device-feed", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        # Se o sync inicial estourou o timeout, o que ele trouxer depois entra pela fila
+        self.prefetch.join()
+        for r in self.prefetch.registry.snapshot(): self._queue.put(r)
+        while not self._stop.wait(self.interval):
+            try:
+                for r in self.prefetch.registry.sync(self.source): self._queue.put(r)
+            except Exception as e:
+                logger.warning(f"Falha no sync de dispositivos durante a execução: {e}")
+
+    def drain(self) -> List[dict]:
+        rows = []
+        while True:
+            try: rows.append(self._queue.get_nowait())
+            except queue.Empty: return rows
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None: self._thread.join(timeout=1.0)
+
+def apply_device_states(device_map: Dict[str, dict], rows: List[dict]) -> List[tuple]:
+    """Aplica as linhas ao manifesto indexado por sumo_id; semáforos por MAC e câmeras por ID, sem varredura.
+
+    Retorna só o que mudou: [(tipo, sumo_id)].
+    """
+    by_mac = {dev['id']: dev for dev in device_map.values() if 'id' in dev}
+    by_camera = {}
+    for dev in device_map.values():
+        cam = dev.get('camera')
+        if cam and 'id' in cam: by_camera.setdefault(cam['id'], []).append(dev)
+
+    changed = []
+    for r in rows:
+        # Dispositivo removido da base: o manifesto mantém o último estado
+        if r.get('deleted_at'): continue
+        mac, st, tp = r['mac_address'], r['status'], r['tipo']
+        if tp == 'SEMAFARO' and mac in by_mac:
+            dev = by_mac[mac]
+            if dev.get('status') != st: changed.append((tp, dev['sumo_id']))
+            dev['status'] = st
+        elif tp == 'CAMERA':
+            for dev in by_camera.get(mac, ()):
+                if dev['camera'].get('status') != st: changed.append((tp, dev['sumo_id']))
+                dev['camera']['status'] = st
+    return changed
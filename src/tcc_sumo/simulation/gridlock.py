@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+import json
+from collections import deque
+from pathlib import Path
+
+import traci.constants as tc
+
+from tcc_sumo.utils.helpers import get_logger
+from tcc_sumo.simulation.backend import traci
+from tcc_sumo.simulation.telemetry import SubscriptionHub
+
+logger = get_logger("Gridlock")
+
+EDGE_VARS = [tc.LAST_STEP_VEHICLE_NUMBER, tc.LAST_STEP_VEHICLE_HALTING_NUMBER, tc.LAST_STEP_MEAN_SPEED]
+
+class GridlockDetector:
+    """Detecta travamento da rede (sem teleporte) pela tendência agregada de velocidade e veículos parados.
+
+    Uma amostra a cada sample_interval passos, lida das subscrições das arestas de aproximação dos semáforos (onde
+    as filas do travamento se formam; subscrever a rede inteira custaria O(arestas) por passo); a janela deslizante
+    cobre 'window' passos. Travou se, em toda a janela, há ao menos min_vehicles veículos, a fração parada
+    fica acima de halting_share, a velocidade média abaixo de max_speed e o número de parados não diminui.
+    """
+
+    def __init__(self, window: int = 600, sample_interval: int = 10, halting_share: float = 0.95,
+                 max_speed: float = 0.5, min_vehicles: int = 20):
+        self.sample_interval = max(1, int(sample_interval))
+        self.halting_share = halting_share
+        self.max_speed = max_speed
+        self.min_vehicles = min_vehicles
+        self.samples = deque(maxlen=max(2, int(window) // self.sample_interval + 1))
+        self.edge_ids = []
+        self.telemetry = None
+        self.next_sample = 0
+
+    def setup(self, telemetry: SubscriptionHub, topology):
+        # Só as subscrições: precisam entrar antes de telemetry.subscribe(); o passo inicial vem em set_state
+        self.edge_ids = list(dict.fromkeys(e for tid in topology for e in topology[tid].edges))
+        if not self.edge_ids:
+            # Rede sem semáforos: todas as arestas normais (as internas ':' ficam de fora)
+            self.edge_ids = [e for e in traci.edge.getIDList() if not e.startswith(':')]
+        self.telemetry = telemetry
+        self.telemetry.require('edge', self.edge_ids, EDGE_VARS)
+        logger.info(f"Detector de travamento: {len(self.edge_ids)} arestas, janela de {(self.samples.maxlen - 1) * self.sample_interval} passos.")
+
+    def get_state(self) -> dict:
+        return {"samples": list(self.samples), "next_sample": self.next_sample}
+
+    def set_state(self, state, step: int):
+        """Janela do checkpoint (None: janela vazia, primeira amostra sample_interval passos após 'step')."""
+        self.samples.clear()
+        if state:
+            self.samples.extend(state['samples'])
+            self.next_sample = state['next_sample']
+        else:
+            self.next_sample = step + self.sample_interval
+
+    def observe(self, step: int) -> bool:
+        """Registra uma amostra quando devida; True se a janela inteira indica travamento."""
+        if step < self.next_sample: return False
+        self.next_sample = step + self.sample_interval
+        res = self.telemetry.domain('edge')
+        vehicles = halting = 0
+        speed_sum = 0.0
+        for e in self.edge_ids:
+            r = res.get(e)
+            if not r: continue
+            n = r[tc.LAST_STEP_VEHICLE_NUMBER]
+            if not n: continue
+            vehicles += n
+            halting += r[tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+            speed_sum += r[tc.LAST_STEP_MEAN_SPEED] * n
+        self.samples.append({"step": step, "vehicles": vehicles, "halting": halting,
+                             "mean_speed": round(speed_sum / vehicles, 3) if vehicles else 0.0})
+        return self._stuck()
+
+    def _stuck(self) -> bool:
+        if len(self.samples) < self.samples.maxlen: return False
+        for s in self.samples:
+            if s['vehicles'] < self.min_vehicles: return False
+            if s['halting'] < self.halting_share * s['vehicles']: return False
+            if s['mean_speed'] > self.max_speed: return False
+        return self.samples[-1]['halting'] >= self.samples[0]['halting']
+
+    def top_edges(self, n: int = 20):
+        res = self.telemetry.domain('edge')
+        ranked = sorted(((res[e][tc.LAST_STEP_VEHICLE_HALTING_NUMBER], e) for e in self.edge_ids if res.get(e)), reverse=True)
+        return [{"edge": e, "halting": h} for h, e in ranked[:n] if h]
+
+    def dump(self, directory, name: str, step: int, state: bool = True) -> dict:
+        """Grava o diagnóstico (janela, arestas mais paradas e, opcionalmente, o estado do SUMO)."""
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        report = {"step": step, "time": traci.simulation.getTime(), "window": list(self.samples), "top_edges": self.top_edges()}
+        if state:
+            state_file = directory / f"{name}_gridlock_state.xml.gz"
+            try:
+                traci.simulation.saveState(str(state_file))
+                report["state_file"] = state_file.name
+            except Exception as e:
+                logger.warning(f"Falha ao salvar o estado do travamento: {e}")
+        out = directory / f"{name}_gridlock.json"
+        with open(out, 'w') as f: json.dump(report, f, indent=4)
+        logger.error(f"Travamento detectado no passo {step}: {self.samples[-1]['halting']}/{self.samples[-1]['vehicles']} veículos parados. Diagnóstico: {out}")
+        return report
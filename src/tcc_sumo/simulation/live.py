@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+import queue
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("LiveMetrics")
+
+class _Subscriber:
+    """Fila limitada de um consumidor: cheia, descarta a mensagem mais antiga (o laço nunca espera)."""
+
+    def __init__(self, maxsize):
+        self.queue = queue.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, msg):
+        while True:
+            try:
+                self.queue.put_nowait(msg)
+                return
+            except queue.Full:
+                try:
+                    self.queue.get_nowait()
+                    self.dropped += 1
+                except queue.Empty: pass
+
+class MetricsPublisher:
+    """Métricas por semáforo em lotes a cada 'interval' s, servidas por SSE em GET /metrics (e GET /latest).
+
+    O laço só acumula em dicts e entrega o lote às filas dos consumidores; serialização e rede ficam
+    nas threads do servidor, então um cliente lento perde lotes em vez de atrasar o simulationStep.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, interval: float = 1.0, scenario: str = "", mode: str = "",
+                 buffer: int = 8):
+        self.interval = interval
+        self.scenario = scenario
+        self.mode = mode
+        self.buffer = buffer
+        self.subscribers = []
+        # Consumidores com thread própria (SupabaseMetricsSink): o close espera que terminem de gravar
+        self.sinks = []
+        self._lock = threading.Lock()
+        self._queue = {}
+        self._arrivals = {}
+        self._next = 0.0
+        self.latest = None
+        self.sent = 0
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name="live-metrics", daemon=True)
+        self._thread.start()
+        logger.info(f"Métricas ao vivo em {self.url} (lote a cada {self.interval:g}s).")
+        return self
+
+    def subscribe(self, maxsize: Optional[int] = None) -> _Subscriber:
+        sub = _Subscriber(maxsize or self.buffer)
+        with self._lock: self.subscribers = self.subscribers + [sub]
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock: self.subscribers = [s for s in self.subscribers if s is not sub]
+
+    def add(self, tid, q, arrivals):
+        self._queue[tid] = q
+        self._arrivals[tid] = self._arrivals.get(tid, 0) + arrivals
+
+    def tick(self, step):
+        # Chamado uma vez por iteração: só um relógio monotônico até o lote vencer
+        now = time.monotonic()
+        if now < self._next: return
+        self._next = now + self.interval
+        self.publish(step)
+
+    def publish(self, step):
+        if not self._queue: return
+        msg = {
+            "scenario": self.scenario,
+            "mode": self.mode,
+            "step": step,
+            "timestamp": time.time(),
+            "tls": {tid: {"queue": q, "arrivals": self._arrivals.get(tid, 0)} for tid, q in self._queue.items()}
+        }
+        self._queue, self._arrivals = {}, {}
+        self.latest = msg
+        self.sent += 1
+        for sub in self.subscribers: sub.offer(msg)
+
+    def close(self, step=None, timeout: float = 5.0):
+        if step is not None: self.publish(step)
+        for sub in self.subscribers: sub.offer(None)
+        for sink in self.sinks: sink.join(timeout)
+        self.server.shutdown()
+        self.server.server_close()
+        dropped = sum(s.dropped for s in self.subscribers)
+        logger.info(f"Métricas ao vivo: {self.sent} lotes publicados, {dropped} descartados por consumidores lentos.")
+
+    def _handler(self):
+        publisher = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, fmt, *args):
+                logger.debug(fmt % args)
+
+            def do_GET(self):
+                if self.path == "/latest": return self._latest()
+                if self.path == "/metrics": return self._stream()
+                self.send_error(404)
+
+            def _latest(self):
+                body = json.dumps(publisher.latest).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                sub = publisher.subscribe()
+                try:
+                    while True:
+                        try: msg = sub.queue.get(timeout=15)
+                        except queue.Empty:
+                            self.wfile.write(b": keep-alive\n\n")
+                            self.wfile.flush()
+                            continue
+                        if msg is None: break
+                        self.wfile.write(f"data: {json.dumps(msg)}\n\n".encode())
+                        self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError): pass
+                finally:
+                    publisher.unsubscribe(sub)
+
+        return Handler
+
+class SupabaseMetricsSink:
+    """Consumidor opcional: grava os lotes no Supabase em inserts agrupados, numa thread própria."""
+
+    def __init__(self, publisher: MetricsPublisher, url: str, key: str, table: str = "metricas_ao_vivo"):
+        from supabase import create_client
+        self.client = create_client(url, key)
+        self.table = table
+        self.sub = publisher.subscribe()
+        self._thread = threading.Thread(target=self._run, name="live-metrics-db", daemon=True)
+        self._thread.start()
+        publisher.sinks = publisher.sinks + [self]
+
+    def join(self, timeout: float = 5.0):
+        self._thread.join(timeout)
+        if self._thread.is_alive(): logger.warning(f"Gravação das métricas ao vivo não terminou em {timeout:g}s: lotes pendentes perdidos.")
+
+    def _run(self):
+        while True:
+            msg = self.sub.queue.get()
+            if msg is None: break
+            rows = [{"sumo_id": tid, "step": msg['step'], "queue": m['queue'], "arrivals": m['arrivals'],
+                     "mode": msg['mode'], "source": f"from_{msg['scenario']}"} for tid, m in msg['tls'].items()]
+            try: self.client.table(self.table).insert(rows).execute()
+            except Exception as e: logger.warning(f"Falha ao gravar métricas ao vivo: {e}")
+
+def read_stream(url):
+    """Cliente SSE mínimo: gera cada lote publicado em 'url' (ex.: para testes locais)."""
+    with urllib.request.urlopen(url) as resp:
+        for raw in resp:
+            line = raw.decode().strip()
+            if line.startswith("data: "): yield json.loads(line[6:])
+
+if __name__ == "__main__":
+    import sys
+    for batch in read_stream(sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:8765/metrics"):
+        print(f"passo {batch['step']}: {len(batch['tls'])} semáforos, fila total {sum(m['queue'] for m in batch['tls'].values())}")
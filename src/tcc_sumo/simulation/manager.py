@@ -1,9 +1,10 @@
 import sys
 import os
-import subprocess
 import time
 import json
-import traci
+import math
+import random
+import traci.constants as tc
 from collections import defaultdict
 from pathlib import Path
 from dotenv import load_dotenv
@@ -15,98 +16,349 @@ if 'SUMO_HOME' in os.environ:
     if tools not in sys.path: sys.path.append(tools)
 
 from tcc_sumo.utils.helpers import get_logger, setup_logging, PROJECT_ROOT
-from tcc_sumo.traffic_logic.controllers import StaticController, AdaptiveController
+from tcc_sumo.simulation.backend import traci
+from tcc_sumo.simulation.traci_connection import TraciConnection, find_free_port
+from tcc_sumo.traffic_logic.controllers import StaticController, NativeStaticController, AdaptiveController, VectorizedAdaptiveController, HAS_NUMPY
+from tcc_sumo.traffic_logic.topology import TopologyIndex
 from tcc_sumo.tools.log_analyzer import LogAnalyzer
+from tcc_sumo.simulation.telemetry import SubscriptionHub
+from tcc_sumo.simulation.recorder import SeriesRecorder, HAS_NUMPY as RECORDER_NUMPY
+from tcc_sumo.simulation.windows import WindowAggregator
+from tcc_sumo.utils.sketches import FlowCounter
+from tcc_sumo.simulation.scheduler import EventScheduler
+from tcc_sumo.simulation.checkpoint import CheckpointStore, load_checkpoint
+from tcc_sumo.simulation.profiler import StepProfiler
+from tcc_sumo.simulation.replay import TraceWriter, read_header
+from tcc_sumo.simulation.server_pool import get_pool
+from tcc_sumo.simulation.live import MetricsPublisher, SupabaseMetricsSink
+from tcc_sumo.simulation.gridlock import GridlockDetector
+from tcc_sumo.simulation.native_outputs import (write_run_additional, aggregate_detectors, controlled_lanes, stats_detector, output_args,
+                                                 EDGE_DATA_OUTPUT, LANE_STATS_OUTPUT)
+from tcc_sumo.simulation.devices import (DeviceRegistry, DeviceStatePrefetch, DeviceFeed, SupabaseDeviceSource, LocalDeviceSource,
+                                         apply_device_states, HAS_SUPABASE)
 
 setup_logging()
 logger = get_logger("SimulationManager")
 
+OFF_STATUSES = ('inactive', 'maintenance')
+
+FIDELITIES = ('micro', 'meso')
+# Sem <scen>.meso.sumocfg gerado, o modo meso liga as mesmas opções pela linha de comando
+MESO_ARGS = ["--mesosim", "true", "--meso-junction-control", "true"]
+
 SB_URL = os.getenv("SUPABASE_URL")
 SB_KEY = os.getenv("SUPABASE_KEY")
 
-try:
-    from supabase import create_client
-    HAS_SUPABASE = True
-except ImportError:
-    HAS_SUPABASE = False
-
 class SimulationManager:
-    def __init__(self, config, scenario_name, mode_name, target_tl_id=None):
+    def __init__(self, config, scenario_name, mode_name, target_tl_id=None, headless=False, port=None, output_dir=None, sumo_args=None, analyze=True,
+                 ctrl_params=None, max_steps=None, resume=None, branch_from=None, final_checkpoint=False,
+                 profile=False, cfg_path=None):
         self.scenario_name = scenario_name
         
-        if scenario_name == 'osm':
+        if cfg_path:
+            # Rede externa (ex.: grades sintéticas do benchmark): sem manifesto de dispositivos
+            self.cfg_path = Path(cfg_path).resolve()
+            self.manifest_path = self.cfg_path.with_name(f"{scenario_name}_devices_manifest.json")
+        elif scenario_name == 'osm':
             self.cfg_path = PROJECT_ROOT / "scenarios/from_osm/osm.sumocfg"
             self.manifest_path = PROJECT_ROOT / "output" / "osm_devices_manifest.json"
         else:
             self.cfg_path = PROJECT_ROOT / "scenarios/from_api/api.sumocfg"
             self.manifest_path = PROJECT_ROOT / "output" / "api_devices_manifest.json"
             
+        # 'meso' roda o SUMO mesoscópico (--mesosim): filas por aresta/segmento, estatísticas e controladores leem o domínio 'edge'
+        self.fidelity = config.get('fidelity', 'micro')
+        if self.fidelity not in FIDELITIES: raise ValueError(f"Fidelidade desconhecida: {self.fidelity} (opções: {', '.join(FIDELITIES)})")
+        self.sense = 'edge' if self.fidelity == 'meso' else 'lane'
+        # adaptive_sensing 'detector': o controlador lê os detectores e2 (fila e ocupação) em vez das faixas inteiras
+        self.ctrl_sense = self.sense
+        if config.get('adaptive_sensing', 'lane') == 'detector':
+            if self.fidelity == 'meso': logger.warning("Detectores e2 não funcionam no mesoscópico: controlador lendo as arestas.")
+            else: self.ctrl_sense = 'lanearea'
+        self.occupancy_threshold = config.get('detector_occupancy_threshold')
+        # detector_threshold: fila (veículos) que aciona a troca lida nos detectores e2; null usa o threshold do controlador
+        self.detector_threshold = config.get('detector_threshold')
+        meso_args = []
+        if self.fidelity == 'meso':
+            meso_cfg = self.cfg_path.with_suffix('.meso.sumocfg')
+            if meso_cfg.exists(): self.cfg_path = meso_cfg
+            else: meso_args = MESO_ARGS
+
         self.scenario_dir = self.cfg_path.parent
-        self.cfg_file_name = self.cfg_path.name
         self.mode = mode_name.upper()
         self.target = target_tl_id
-        self.ctrl = AdaptiveController() if self.mode == 'ADAPTIVE' else StaticController()
+        self.ctrl = self._build_controller(config, ctrl_params or {})
+        self.max_steps = max_steps
+
+        # 'event' salta com simulationStep(t) até o próximo despertar; 'step' avança 1 s por iteração
+        self.scheduler = config.get('scheduler', 'step')
+        self.stats_interval = max(1, int(config.get('stats_interval', 1)))
+        self.max_jump = max(1, int(config.get('max_jump', 60)))
+        self.verify_plan = config.get('verify_native_plan', False) and isinstance(self.ctrl, NativeStaticController)
+        self.plan_mismatches = 0
         
         self.device_map = {} 
-        self.global_stats = defaultdict(lambda: {'total_cars': set(), 'max_q': 0, 'sum_q': 0, 'samples': 0})
+        # Estados dos dispositivos buscados em paralelo com a partida do SUMO; snapshot local vale por device_cache_ttl s
+        self.device_source = config.get('device_source', 'supabase')
+        self.device_states_file = config.get('device_states_file')
+        self.device_cache_ttl = float(config.get('device_cache_ttl', 300))
+        self.device_fetch_timeout = float(config.get('device_fetch_timeout', 2.0))
+        self.device_prefetch = None
+        # device_live: aplica mudanças de estado durante a execução (sync por delta a cada device_poll_interval s)
+        self.device_live = config.get('device_live', False)
+        self.device_poll_interval = float(config.get('device_poll_interval', 5.0))
+        self.device_feed = None
+        self.replay_devices = None
+        self.saved_programs = {}
+        # Laço por eventos: heap ativo e semáforos com despertar pendente (religar não duplica a cadeia)
+        self.sched = None
+        self.pending_wakeups = set()
+        # 'sketch' troca o set de IDs por um HyperLogLog (memória fixa por semáforo) acima de flow_exact_limit veículos
+        self.flow_counter = config.get('flow_counter', 'sketch')
+        self.flow_precision = int(config.get('flow_counter_precision', 12))
+        self.flow_exact_limit = int(config.get('flow_exact_limit', 1024)) if self.flow_counter == 'sketch' else math.inf
+        self.global_stats = defaultdict(lambda: {'total_cars': FlowCounter(self.flow_precision, self.flow_exact_limit), 'max_q': 0, 'sum_q': 0, 'samples': 0})
+
+        # Série temporal por amostra (fila, chegadas) em shards .npz; memória fixa de 2 x series_chunk linhas
+        self.record_series = config.get('record_series', False)
+        self.series_chunk = max(1, int(config.get('series_chunk', 3600)))
+        self.recorder = None
+
+        # Tickets por janela (s) gravados em JSONL durante a execução, com P50/P95 de fila
+        self.window_sizes = config.get('ticket_windows', [300, 900]) or []
+        self.windows = None
+        self.last_sample = -1
+
+        # Lotes de métricas por semáforo via SSE (e opcionalmente Supabase); consumidor lento perde lotes, não atrasa o passo
+        self.live_metrics = config.get('live_metrics', False)
+        self.live_host = config.get('live_metrics_host', '127.0.0.1')
+        self.live_port = int(config.get('live_metrics_port', 8765))
+        self.live_interval = float(config.get('live_metrics_interval', 1.0))
+        self.live_db = config.get('live_metrics_db', False)
+        self.live_table = config.get('live_metrics_table', 'metricas_ao_vivo')
+        self.publisher = None
+
+        # Sem teleporte uma rede travada nunca esvazia: gridlock_detection encerra a execução e grava um diagnóstico
+        self.gridlock = None
+        if config.get('gridlock_detection', False):
+            self.gridlock = GridlockDetector(int(config.get('gridlock_window', 600)), int(config.get('gridlock_sample_interval', 10)),
+                                             float(config.get('gridlock_halting_share', 0.95)), float(config.get('gridlock_max_speed', 0.5)),
+                                             int(config.get('gridlock_min_vehicles', 20)))
+        self.gridlock_report = None
+        # Falha da execução (SUMO não subiu, caiu no meio, ...): run() só registra; quem chama consulta aqui
+        self.error = None
+
+        # --profile: tempo por fase do laço, chamadas TraCI e CPU/RSS amostrados; relatório ao lado dos tickets
+        self.profiler = StepProfiler(float(config.get('profile_sample_interval', 1.0))) if profile else None
+
+        # 'subscription' lê a telemetria num lote por passo; 'poll' mantém as chamadas TraCI individuais;
+        # 'native' não lê nada por passo: o SUMO agrega nos detectores e2/edgeData e os arquivos são lidos no fim
+        self.stats_mode = config.get('stats_mode', 'subscription')
+        self.edge_data_period = float(config.get('edge_data_period', 300))
+        self.detector_period = float(config.get('detector_period', 60))
+        if self.stats_mode == 'native' and (self.record_series or self.window_sizes or self.live_metrics):
+            logger.info("stats_mode native: série temporal, janelas e métricas ao vivo dependem do passo a passo e ficam desligadas.")
+            self.record_series, self.window_sizes, self.live_metrics = False, [], False
+        if self.stats_mode == 'native' and self.fidelity == 'meso':
+            logger.warning("stats_mode native com fidelity meso: o SUMO mesoscópico não mede filas em detectores e2, só o edgeData será útil.")
+        self.telemetry = SubscriptionHub()
+        self.topology = None
+        self.monitored_ids = []
+        self.stats_ids = []
+
+        # 'traci' (socket, com GUI), 'libsumo' (em processo, headless) ou 'replay' (respostas de trace_file, sem SUMO)
+        self.backend = config.get('backend', 'traci')
+        self.trace_file = config.get('trace_file')
+        # record_trace: grava todas as respostas TraCI desta execução para replay posterior
+        self.record_trace = config.get('record_trace')
+        self.trace_writer = None
+        if self.backend == 'replay':
+            # Replay: dispositivos do cabeçalho do trace, sem base nem mudanças ao vivo (as respostas já estão gravadas)
+            self.replay_devices = read_header(self.trace_file).get('devices', []) if self.trace_file else []
+            self.device_live = False
+        elif self.record_trace and self.device_live:
+            logger.warning("record_trace com device_live: o replay não reproduz mudanças de dispositivos feitas durante a execução.")
+
+        # Headless: 'sumo' sem display, porta própria e saída isolada -> várias execuções por máquina
+        self.headless = headless or config.get('headless', False)
+        self.sumo_executable = config.get('sumo_executable', 'sumo-gui')
+        if self.headless: self.sumo_executable = self._headless_executable(self.sumo_executable)
+        self.port = port or (find_free_port() if self.headless else config.get('traci_port', 8813))
+        # Absoluto: o SUMO roda com cwd no diretório do cenário, o Python no diretório de quem chamou
+        self.output_dir = Path(output_dir).resolve() if output_dir else PROJECT_ROOT / "output"
+        self.connection = None
+        # sumo_pool: reaproveita servidores SUMO do processo via traci.load (só backend traci, headless)
+        self.sumo_pool = config.get('sumo_pool', False) and self.backend == 'traci' and self.headless
+        self.pool_size = int(config.get('sumo_pool_size', 1))
+        self.pool_max_runs = int(config.get('sumo_pool_max_runs', 50))
+
+        # Execução com diretório próprio: as saídas do SUMO também vão para ele
+        self.sumo_args = list(sumo_args or []) + meso_args
+        self.analyze = analyze
+        self.trip_info = None
+        self.redirect_outputs = bool(output_dir)
+        if output_dir:
+            self.trip_info = self.output_dir / "tripinfo.xml"
+            self.sumo_args += ["--tripinfo-output", str(self.trip_info)]
+            # Demais '*-output' do .sumocfg; os arquivos dos adicionais são redirecionados em run()
+            self.sumo_args += output_args(self.cfg_path, self.output_dir, skip=self.sumo_args)
+
+        # Checkpoint a cada checkpoint_interval passos (0 desliga): saveState do SUMO + estado do controlador e das estatísticas
+        self.checkpoint_interval = max(0, int(config.get('checkpoint_interval', 0)))
+        self.checkpoints = CheckpointStore(self.output_dir / "checkpoints", int(config.get('checkpoint_keep', 2)))
+        self.final_checkpoint = final_checkpoint
+        self.next_checkpoint = None
+        # resume: continua a mesma execução; branch_from: novo controlador e estatísticas a partir de um snapshot de aquecimento
+        if resume and branch_from: raise ValueError("resume e branch_from são exclusivos.")
+        self.resume = load_checkpoint(resume) if resume else None
+        self.branch = load_checkpoint(branch_from) if branch_from else None
+        if self.resume: self._check_resume(self.resume)
+        if self.resume and self.stats_mode == 'native': raise ValueError("stats_mode native não suporta resume: as saídas do SUMO recomeçam no processo novo.")
+        self.start_step = 0
+        self.t0 = 0.0
+        self.dt = 1.0
         
         self._load_device_states()
 
+    def _build_controller(self, config, ctrl_params):
+        if self.mode != 'ADAPTIVE':
+            # 'native' instala o plano completo via setProgramLogic; 'python' troca as fases a cada passo
+            if config.get('static_engine', 'python') == 'native': return NativeStaticController()
+            return StaticController()
+        params = dict(ctrl_params, sense=self.ctrl_sense)
+        if self.ctrl_sense == 'lanearea':
+            params.setdefault('occupancy_threshold', self.occupancy_threshold)
+            params.setdefault('detector_threshold', self.detector_threshold)
+        # 'vectorized' decide todos os semáforos em lote (NumPy); 'python' avalia um a um
+        if config.get('adaptive_engine', 'python') == 'vectorized':
+            if HAS_NUMPY: return VectorizedAdaptiveController(**params)
+            logger.warning("NumPy indisponível: usando o AdaptiveController escalar.")
+        return AdaptiveController(**params)
+
     def _load_device_states(self):
         local_data = []
         if self.manifest_path.exists():
             with open(self.manifest_path, 'r') as f: local_data = json.load(f)
-        
-        mac_to_sumo = {d['id']: d['sumo_id'] for d in local_data if 'sumo_id' in d}
         self.device_map = {d['sumo_id']: d for d in local_data if 'sumo_id' in d}
+        if self.replay_devices is not None:
+            self.device_map = {d['sumo_id']: d for d in self.replay_devices}
+            logger.info(f"Replay: {len(self.device_map)} dispositivos lidos do trace.")
+            return
 
-        if HAS_SUPABASE and self.scenario_name == 'api' and SB_URL and SB_KEY:
-            try:
-                client = create_client(SB_URL, SB_KEY)
-                res = client.from_("dispositivos").select("mac_address, status, tipo").execute()
-                for r in res.data:
-                    mac, st, tp = r['mac_address'], r['status'], r['tipo']
-                    if tp == 'SEMAFARO' and mac in mac_to_sumo:
-                        sid = mac_to_sumo[mac]
-                        if sid in self.device_map: self.device_map[sid]['status'] = st
-                    if tp == 'CAMERA':
-                        for sid, dev in self.device_map.items():
-                            if dev.get('camera', {}).get('id') == mac:
-                                dev['camera']['status'] = st
-                logger.info("Estados sincronizados via Supabase.")
-            except Exception as e:
-                logger.warning(f"Erro Supabase: {e}")
-        else:
+        source = self._device_source()
+        if source is None:
             logger.info("Modo OSM (Offline): Usando estados padrão.")
+            return
+        registry = DeviceRegistry(PROJECT_ROOT / "output" / f"{self.scenario_name}_device_registry.json", self.device_cache_ttl)
+        self.device_prefetch = DeviceStatePrefetch(source, registry).start()
+
+    def _device_source(self):
+        if self.device_source == 'local' and self.device_states_file:
+            return LocalDeviceSource(PROJECT_ROOT / self.device_states_file)
+        if self.device_source == 'supabase' and HAS_SUPABASE and self.scenario_name == 'api' and SB_URL and SB_KEY:
+            return SupabaseDeviceSource(SB_URL, SB_KEY)
+        return None
 
-    def _kill_existing_sumo(self):
+    def _apply_device_states(self):
+        if self.device_prefetch is None: return
+        rows = self.device_prefetch.result(self.device_fetch_timeout)
+        if rows is None: return
+        changed = apply_device_states(self.device_map, rows)
+        logger.info(f"Estados sincronizados: {len(changed)} dispositivos atualizados.")
+
+    def _start_device_feed(self):
+        if not self.device_live or self.device_prefetch is None: return
+        self.device_feed = DeviceFeed(self.device_prefetch.source, self.device_prefetch, self.device_poll_interval).start()
+        logger.info(f"Estados de dispositivos ao vivo: sync a cada {self.device_poll_interval:g}s.")
+
+    def _drain_device_updates(self, step):
+        rows = self.device_feed.drain()
+        if not rows: return
+        cameras = False
+        for kind, tid in apply_device_states(self.device_map, rows):
+            if kind == 'CAMERA': cameras = True
+            elif tid in self.topology: self._set_device_program(tid, self.device_map[tid].get('status'), step)
+        if cameras: self.monitored_ids = [tid for tid in self._monitored_ids() if tid in self.stats_ids]
+
+    def _set_device_program(self, tid, status, step):
+        # Desligar guarda o programa corrente; religar devolve o semáforo a ele
         try:
-            subprocess.run(["pkill", "-9", "sumo-gui"], stderr=subprocess.DEVNULL)
-            time.sleep(0.5)
-        except: pass
+            if status in OFF_STATUSES:
+                if tid in self.saved_programs: return
+                self.saved_programs[tid] = traci.trafficlight.getProgram(tid)
+                self.ctrl.pause(tid)
+                traci.trafficlight.setProgram(tid, "off")
+            else:
+                program = self.saved_programs.pop(tid, None)
+                if program is None: return
+                traci.trafficlight.setProgram(tid, program)
+                self.ctrl.resume(tid, step)
+                if self.sched is not None: self._schedule_tls(tid, step)
+            logger.info(f"Passo {step}: {tid} -> {status}")
+        except Exception as e:
+            logger.warning(f"Falha ao aplicar estado {status} em {tid}: {e}")
+
+    def _check_resume(self, payload):
+        found = (payload['scenario'], payload['mode'], payload['controller_class'], payload.get('fidelity', 'micro'))
+        expected = (self.scenario_name, self.mode, type(self.ctrl).__name__, self.fidelity)
+        if found != expected: raise ValueError(f"Checkpoint incompatível: {found} != {expected}")
+
+    def _headless_executable(self, exe):
+        p = Path(exe)
+        return str(p.with_name("sumo")) if p.name.startswith("sumo-gui") else exe
 
     def run(self):
         logger.info(f"Iniciando Simulação [{self.mode}] ({self.scenario_name})...")
-        self._kill_existing_sumo()
-        
-        cmd = ["sumo-gui", "-c", self.cfg_file_name, "--start", "--quit-on-end", "--no-warnings"]
-        original_cwd = Path.cwd()
-        os.chdir(self.scenario_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if self.stats_mode == 'native':
+            add = write_run_additional(self.cfg_path, self.output_dir, self.edge_data_period, self.detector_period, controlled_lanes(self.cfg_path))
+            self.sumo_args += ["--additional-files", str(add)]
+        elif self.redirect_outputs:
+            self.sumo_args += ["--additional-files", str(write_run_additional(self.cfg_path, self.output_dir))]
+        self.connection = TraciConnection(self.sumo_executable, str(self.cfg_path), self.port, backend=self.backend,
+                                          cwd=self.scenario_dir, extra_args=self.sumo_args, trace=self.trace_file,
+                                          pool=get_pool(self.pool_size, self.pool_max_runs) if self.sumo_pool else None)
         
         try:
-            traci.start(cmd)
+            self.connection.start()
+            # Antes do trace: o cabeçalho guarda os dispositivos já sincronizados
+            self._apply_device_states()
+            if self.record_trace:
+                self.trace_writer = TraceWriter(self.record_trace, self.device_map.values())
+                traci.observe(self.trace_writer)
+            if self.branch:
+                traci.simulation.loadState(self.branch['state_file'])
+                self.start_step = self.branch['step'] + 1
+                logger.info(f"Ramificando do snapshot no passo {self.branch['step']}: {self.branch['state_file']}")
+            self.dt = traci.simulation.getDeltaT()
+            self.topology = TopologyIndex.build(traci.trafficlight.getIDList())
             
-            active_ids = []
-            for tid in traci.trafficlight.getIDList():
+            if isinstance(self.ctrl, NativeStaticController):
+                end = traci.simulation.getEndTime()
+                self.ctrl.horizon = self.max_steps or (int(end) if end > 0 else self.ctrl.horizon)
+            # Todos os semáforos entram no controlador; os desligados ficam pausados até serem religados
+            self.ctrl.setup(list(self.topology), self.topology, self.telemetry)
+            if self.branch: self.ctrl.rebase(self.start_step)
+            self._setup_stats()
+            if self.gridlock: self.gridlock.setup(self.telemetry, self.topology)
+            if self.telemetry.requests: self.telemetry.subscribe()
+            saved = self.resume or {}
+            self._setup_recorder(saved.get('recorder'))
+            if self.window_sizes:
+                self.windows = WindowAggregator(self.output_dir / f"{self.scenario_name}_window_tickets.jsonl", self.window_sizes,
+                                                self.scenario_name, self.mode, self.device_map, dt=self.dt, state=saved.get('windows'))
+            self._setup_publisher()
+            if self.resume: self._restore(self.resume)
+            if self.gridlock: self.gridlock.set_state(saved.get('gridlock'), self.start_step)
+            # Depois do restore: os estados atuais dos dispositivos prevalecem sobre os do checkpoint
+            for tid in self.topology:
                 dev = self.device_map.get(tid)
-                if dev and dev.get('status') in ['inactive', 'maintenance']:
-                    traci.trafficlight.setProgram(tid, "off")
-                else:
-                    active_ids.append(tid)
-
-            self.ctrl.setup(active_ids)
+                if dev: self._set_device_program(tid, dev.get('status'), self.start_step - 1)
+            self.t0 = traci.simulation.getTime() - self.start_step * self.dt
+            if self.checkpoint_interval: self.next_checkpoint = self.start_step + self.checkpoint_interval
+            self._start_device_feed()
             
-            if self.target and self.target in active_ids:
+            if self.target and self.target in self.topology and self.target not in self.ctrl.paused and not self.headless and traci.supports_gui:
                 try:
                     x, y = traci.junction.getPosition(self.target)
                     traci.gui.setSchema("View #0", "real_world")
@@ -114,69 +366,299 @@ class SimulationManager:
                     traci.gui.setOffset("View #0", x, y)
                 except: pass
 
-            self._loop()
+            if self.profiler:
+                traci.count_calls(self.profiler.calls)
+                self.profiler.start(self.connection.pid)
+            if self.scheduler == 'event': self._loop_events()
+            else: self._loop()
+            if self.profiler: self._write_profile()
+            if self.final_checkpoint: self._save_checkpoint(self._current_step())
             
         except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
             logger.critical(f"Erro Simulação: {e}")
         finally:
-            os.chdir(original_cwd)
-            self._generate_tickets()
-            try: LogAnalyzer(mode=self.mode).run()
-            except: pass
+            if self.profiler:
+                traci.count_calls(None)
+                self.profiler.stop()
+            if self.device_feed: self.device_feed.stop()
+            if self.trace_writer:
+                traci.unobserve(self.trace_writer)
+                self.trace_writer.close()
+            self.connection.close()
+            if self.recorder: self.recorder.close()
+            if self.windows: self.windows.close(self.last_sample + 1)
+            if self.publisher: self.publisher.close(self.last_sample)
+            # Depois do close: o SUMO só completa os arquivos de saída ao encerrar (ou recarregar) a simulação
+            if self.stats_mode == 'native' and self.topology is not None: self._collect_native_stats()
+            tickets = self._generate_tickets()
+            if self.analyze:
+                # Saídas redirecionadas (output_dir ou nativo): o edgeData do cenário seria de outra execução
+                edge_data = self.output_dir / EDGE_DATA_OUTPUT if self.stats_mode == 'native' or self.redirect_outputs else None
+                try: LogAnalyzer(mode=self.mode, trip_info=self.trip_info, scen_path=self.scenario_dir if self.trip_info else None, edge_data=edge_data).run()
+                except: pass
+        return tickets
 
     def _loop(self):
-        step = 0
+        step = self.start_step
+        lap = self.profiler.lap if self.profiler else None
         try:
             while traci.simulation.getMinExpectedNumber() > 0:
+                if self.max_steps is not None and step >= self.max_steps: break
+                if lap: lap('loop')
                 traci.simulationStep()
+                if lap: lap('simulationStep')
+                if self.telemetry.requests: self.telemetry.refresh()
+                if lap: lap('telemetry')
                 self.ctrl.manage_traffic_lights(step)
+                if lap: lap('controller')
                 self._collect_stats(step)
+                if lap: lap('stats')
+                if self.gridlock and self.gridlock.observe(step):
+                    self._on_gridlock(step)
+                    break
+                if self.verify_plan: self._verify_plan(step)
+                self._maybe_checkpoint(step)
+                if self.device_feed: self._drain_device_updates(step)
+                if lap: lap('other')
                 step += 1
-        except: pass
-        finally:
-            try: traci.close()
-            except: pass
+        except Exception as e:
+            logger.error(f"Laço interrompido no passo {step}: {e}")
+        if self.verify_plan: logger.info(f"Verificação do plano nativo: {self.plan_mismatches} divergências de estado.")
 
-    def _collect_stats(self, step):
-        for tid in self.global_stats.keys() if self.global_stats else traci.trafficlight.getIDList():
+    def _loop_events(self):
+        sched = self.sched = EventScheduler()
+        start, dt = self.t0, traci.simulation.getDeltaT()
+        step = self.start_step
+        for tid in self.ctrl.tls_ids: self._schedule_tls(tid, step - 1)
+        if self.stats_mode != 'native' or self.verify_plan: sched.schedule(step, ('stats', None))
+        if self.gridlock: sched.schedule(self.gridlock.next_sample, ('gridlock', None))
+        lap = self.profiler.lap if self.profiler else None
+
+        try:
+            while traci.simulation.getMinExpectedNumber() > 0:
+                # Salto limitado por max_jump para continuar verificando o fim da simulação
+                target = min(max(step, sched.next_step() if len(sched) else step + self.max_jump), step + self.max_jump)
+                if self.max_steps is not None and target >= self.max_steps:
+                    if self.max_steps > step: traci.simulationStep(start + self.max_steps * dt)
+                    break
+                if lap: lap('loop')
+                traci.simulationStep(start + (target + 1) * dt)
+                if lap: lap('simulationStep')
+                step = target
+                if self.telemetry.requests: self.telemetry.refresh()
+                if lap: lap('telemetry')
+
+                due = sched.pop_due(step)
+                tls_due = [key for kind, key in due if kind == 'tls']
+                self.pending_wakeups.difference_update(tls_due)
+                # Desligados saem do heap aqui; voltam em _set_device_program ao serem religados
+                tls_due = [tid for tid in tls_due if tid not in self.ctrl.paused]
+                if tls_due:
+                    self.ctrl.manage_traffic_lights(step, tls_due)
+                    for tid in tls_due: self._schedule_tls(tid, step)
+                if lap: lap('controller')
+                if ('stats', None) in due:
+                    self._collect_stats(step)
+                    if self.verify_plan: self._verify_plan(step)
+                    sched.schedule(step + self.stats_interval, ('stats', None))
+                if lap: lap('stats')
+                if ('gridlock', None) in due:
+                    if self.gridlock.observe(step):
+                        self._on_gridlock(step)
+                        break
+                    sched.schedule(self.gridlock.next_sample, ('gridlock', None))
+                self._maybe_checkpoint(step)
+                if self.device_feed: self._drain_device_updates(step)
+                if lap: lap('other')
+                step += 1
+        except Exception as e:
+            logger.error(f"Laço por eventos interrompido no passo {step}: {e}")
+        if self.verify_plan: logger.info(f"Verificação do plano nativo: {self.plan_mismatches} divergências de estado.")
+
+    def _on_gridlock(self, step):
+        try: self.gridlock_report = self.gridlock.dump(self.output_dir, self.scenario_name, step)
+        except Exception as e:
+            logger.error(f"Travamento no passo {step}; falha ao gravar o diagnóstico: {e}")
+            self.gridlock_report = {"step": step}
+
+    def _schedule_tls(self, tid, step):
+        if tid in self.ctrl.paused or tid in self.pending_wakeups: return
+        wake = self.ctrl.next_wakeup(tid, step)
+        if wake is None: return
+        self.pending_wakeups.add(tid)
+        self.sched.schedule(wake, ('tls', tid))
+
+    def _write_profile(self):
+        steps = self._current_step() + 1 - self.start_step
+        self.profiler.write(self.output_dir / f"{self.scenario_name}_profile.json", steps)
+
+    def _current_step(self):
+        # Último passo processado: a iteração 'step' deixa o SUMO no instante t0 + (step + 1) * dt
+        return int(round((traci.simulation.getTime() - self.t0) / traci.simulation.getDeltaT())) - 1
+
+    def _maybe_checkpoint(self, step):
+        if self.next_checkpoint is None or step + 1 < self.next_checkpoint: return
+        try: self._save_checkpoint(step)
+        except Exception as e: logger.error(f"Falha ao salvar checkpoint no passo {step}: {e}")
+        self.next_checkpoint = step + 1 + self.checkpoint_interval
+
+    def _save_checkpoint(self, step):
+        return self.checkpoints.save(step, {
+            "scenario": self.scenario_name,
+            "mode": self.mode,
+            "controller_class": type(self.ctrl).__name__,
+            "fidelity": self.fidelity,
+            "controller": self.ctrl.get_state(),
+            "global_stats": dict(self.global_stats),
+            "last_sample": self.last_sample,
+            "plan_mismatches": self.plan_mismatches,
+            "saved_programs": dict(self.saved_programs),
+            "recorder": self.recorder.checkpoint() if self.recorder else None,
+            "windows": self.windows.get_state() if self.windows else None,
+            "gridlock": self.gridlock.get_state() if self.gridlock else None,
+            "random": random.getstate()
+        })
+
+    def _restore(self, payload):
+        # Depois do setup: o loadState sobrescreve as fases que o setup ajustou
+        step = payload['step']
+        traci.simulation.loadState(payload['state_file'])
+        self.ctrl.set_state(payload['controller'], step)
+        self.global_stats.update(payload['global_stats'])
+        self.last_sample = payload['last_sample']
+        self.plan_mismatches = payload['plan_mismatches']
+        self.saved_programs = dict(payload.get('saved_programs', {}))
+        random.setstate(payload['random'])
+        self.start_step = step + 1
+        logger.info(f"Retomando do checkpoint no passo {step}: {payload['state_file']}")
+
+    def _verify_plan(self, step):
+        mismatches = self.ctrl.verify(step)
+        if mismatches:
+            self.plan_mismatches += len(mismatches)
+            logger.debug(f"Passo {step}: plano nativo diverge em {mismatches[:5]}")
+
+    def _monitored_ids(self):
+        ids = []
+        for tid in self.topology:
             dev = self.device_map.get(tid)
             if dev and dev.get('camera', {}).get('status') != 'active': continue
+            ids.append(tid)
+        return ids
+
+    def _setup_stats(self):
+        self.monitored_ids = self._monitored_ids()
+        # Ao vivo, uma câmera pode ser ligada no meio da execução: subscreve as faixas de todos os semáforos
+        self.stats_ids = list(self.topology) if self.device_live else self.monitored_ids
+        if self.stats_mode != 'subscription': return
+        # Ordenado: a ordem das subscrições não pode depender do PYTHONHASHSEED (o replay confere chamada a chamada)
+        sensors = sorted({s for tid in self.stats_ids for s in self.topology[tid].sensors(self.sense)})
+        self.telemetry.require(self.sense, sensors, [tc.LAST_STEP_VEHICLE_HALTING_NUMBER, tc.LAST_STEP_VEHICLE_ID_LIST])
+
+    def _setup_recorder(self, state=None):
+        if not self.record_series: return
+        if not RECORDER_NUMPY:
+            logger.warning("NumPy indisponível: série temporal desativada.")
+            return
+        series_dir = self.output_dir / f"{self.scenario_name}_series"
+        # Colunas de stats_ids: ao vivo, câmeras ligadas no meio da execução também entram na série
+        self.recorder = SeriesRecorder(series_dir, self.stats_ids, self.series_chunk, state=state)
+
+    def _setup_publisher(self):
+        if not self.live_metrics: return
+        try:
+            self.publisher = MetricsPublisher(self.live_host, self.live_port, self.live_interval, self.scenario_name, self.mode).start()
+        except OSError as e:
+            logger.warning(f"Métricas ao vivo desativadas: {e}")
+            return
+        if self.live_db and HAS_SUPABASE and SB_URL and SB_KEY:
+            SupabaseMetricsSink(self.publisher, SB_URL, SB_KEY, self.live_table)
 
+    def _collect_stats(self, step):
+        if self.stats_mode == 'native': return
+        if self.windows: self.windows.advance(step)
+        if self.stats_mode == 'subscription': self._collect_stats_subscription(step)
+        else: self._collect_stats_poll(step)
+        if self.recorder: self.recorder.commit(step)
+        if self.publisher: self.publisher.tick(step)
+        self.last_sample = step
+
+    def _collect_stats_subscription(self, step):
+        results = self.telemetry.domain(self.sense)
+        for tid in self.monitored_ids:
+            q = 0
+            vehs = []
+            for s in self.topology[tid].sensors(self.sense):
+                r = results.get(s)
+                if not r: continue
+                q += r[tc.LAST_STEP_VEHICLE_HALTING_NUMBER]
+                vehs.extend(r[tc.LAST_STEP_VEHICLE_ID_LIST])
+            self._record(tid, q, vehs)
+
+    def _collect_stats_poll(self, step):
+        api = getattr(traci, self.sense)
+        for tid in self.monitored_ids:
             try:
-                lanes = traci.trafficlight.getControlledLanes(tid)
                 q = 0
-                for l in set(lanes):
-                    q += traci.lane.getLastStepHaltingNumber(l)
-                    vehs = traci.lane.getLastStepVehicleIDs(l)
-                    for v in vehs: self.global_stats[tid]['total_cars'].add(v)
-                
-                self.global_stats[tid]['sum_q'] += q
-                self.global_stats[tid]['samples'] += 1
-                if q > self.global_stats[tid]['max_q']:
-                    self.global_stats[tid]['max_q'] = q
+                vehs = []
+                for s in self.topology[tid].sensors(self.sense):
+                    q += api.getLastStepHaltingNumber(s)
+                    vehs.extend(api.getLastStepVehicleIDs(s))
+                self._record(tid, q, vehs)
             except: pass
 
+    def _collect_native_stats(self):
+        path = self.output_dir / LANE_STATS_OUTPUT
+        if not path.exists():
+            logger.warning(f"Saída dos detectores não encontrada: {path}")
+            return
+        groups = {tid: [stats_detector(l) for l in self.topology[tid].lanes] for tid in self.monitored_ids}
+        try: stats = aggregate_detectors(path, groups, self.dt)
+        except Exception as e:
+            logger.error(f"Falha ao ler {path}: {e}")
+            return
+        for tid, s in stats.items(): self.global_stats[tid].update(s)
+        logger.info(f"Estatísticas nativas: {len(stats)} semáforos lidos de {path}")
+
+    def _record(self, tid, q, vehs):
+        stats = self.global_stats[tid]
+        arrivals = stats['total_cars'].observe(vehs)
+        stats['sum_q'] += q
+        stats['samples'] += 1
+        if q > stats['max_q']: stats['max_q'] = q
+        if self.recorder: self.recorder.set(tid, q, arrivals)
+        if self.windows: self.windows.add(tid, q, arrivals)
+        if self.publisher: self.publisher.add(tid, q, arrivals)
+
     def _generate_tickets(self):
         tickets = []
         for tid, data in self.global_stats.items():
             if data['samples'] == 0: continue
             avg_q = data['sum_q'] / data['samples']
             dev = self.device_map.get(tid, {})
+            if 'flow' in data:
+                # Nativo: o pico por passo da fila somada não existe na saída agregada, vai como pico por faixa
+                metrics = {"flow_count": data['flow'], "max_lane_queue": data['max_lane_q'], "avg_queue": round(avg_q, 2)}
+            else:
+                metrics = {"flow_count": len(data['total_cars']), "max_queue": data['max_q'], "avg_queue": round(avg_q, 2)}
             
             tickets.append({
                 "sumo_id": tid,
                 "tls_mac": dev.get('id', 'N/A'),
                 "camera_mac": dev.get('camera', {}).get('id', 'N/A'),
                 "source": f"from_{self.scenario_name}",
-                "metrics": {
-                    "flow_count": len(data['total_cars']),
-                    "max_queue": data['max_q'],
-                    "avg_queue": round(avg_q, 2)
-                },
+                "metrics": metrics,
                 "mode": self.mode,
+                "gridlocked": self.gridlock_report is not None,
                 "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
             })
         
-        out_file = PROJECT_ROOT / "output" / f"{self.scenario_name}_simulation_tickets.json"
+        approx = sum(1 for d in self.global_stats.values() if 'flow' not in d and d['total_cars'].approximate)
+        if approx: logger.info(f"flow_count aproximado (HyperLogLog p={self.flow_precision}, erro padrão ~{104 / math.sqrt(1 << self.flow_precision):.1f}%) em {approx} semáforos.")
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        out_file = self.output_dir / f"{self.scenario_name}_simulation_tickets.json"
         with open(out_file, 'w') as f: json.dump(tickets, f, indent=4)
-        logger.info(f"Tickets gerados: {out_file}")
\ No newline at end of file
+        logger.info(f"Tickets gerados: {out_file}")
+        return tickets
\ No newline at end of file
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+import gzip
+import xml.etree.ElementTree as ET
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable
+
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("NativeOutputs")
+
+# Mesmos nomes que os geradores de cenário usam no .sumocfg
+DETECTOR_OUTPUT = "traffic.xml"
+EDGE_DATA_OUTPUT = "edge_data.xml"
+LANE_STATS_OUTPUT = "lane_stats.xml"
+RUN_ADDITIONAL = "run_outputs.add.xml"
+# Detectores de faixa inteira só para as estatísticas; a topologia não os usa como sensores
+STATS_PREFIX = "stats:"
+
+def stats_detector(lane: str) -> str:
+    return f"{STATS_PREFIX}{lane}"
+
+def controlled_lanes(cfg_path) -> list:
+    """Faixas controladas por semáforo, lidas das conexões do net-file do .sumocfg (antes de o SUMO subir)."""
+    cfg_path = Path(cfg_path)
+    nets = _cfg_files(ET.parse(cfg_path).getroot(), 'net-file')
+    if not nets: return []
+    net_path = cfg_path.parent / nets[0]
+    lanes = {}
+    with (gzip.open(net_path) if net_path.suffix == '.gz' else open(net_path, 'rb')) as f:
+        for _, elem in ET.iterparse(f):
+            if elem.tag == 'connection' and elem.get('tl'):
+                lanes[f"{elem.get('from')}_{elem.get('fromLane')}"] = None
+            if elem.tag in ('edge', 'connection', 'junction', 'tlLogic'): elem.clear()
+    return list(lanes)
+
+def _cfg_files(root, option: str) -> list:
+    elem = root.find(f'.//{option}')
+    return [v for v in elem.get('value', '').split(',') if v.strip()] if elem is not None else []
+
+def output_args(cfg_path, out_dir, skip: Iterable[str] = ()) -> list:
+    """Repete na linha de comando as opções '*-output' do .sumocfg, apontadas para out_dir."""
+    if not Path(cfg_path).exists(): return []
+    root = ET.parse(cfg_path).getroot()
+    args = []
+    for elem in root.iter():
+        opt = f"--{elem.tag}"
+        if elem.tag.endswith('-output') and elem.get('value') and opt not in skip:
+            args += [opt, str(Path(out_dir) / Path(elem.get('value')).name)]
+    return args
+
+def write_run_additional(cfg_path, out_dir, edge_period: float = None, detector_period: float = None, lanes: Iterable[str] = ()) -> Path:
+    """Cópia dos adicionais do .sumocfg com todo atributo 'file' apontado para out_dir.
+
+    Passado em --additional-files, substitui os adicionais do .sumocfg: execuções paralelas não disputam os arquivos.
+    Para o modo nativo, edge_period/detector_period sobrescrevem os períodos (um edgeData é criado se faltar) e
+    'lanes' recebe um e2 de faixa inteira (pos=0, endPos=-1) cada. Os detectores do cenário (poucos metros junto à
+    retenção) continuam como sensores dos controladores; as estatísticas saem dos de faixa inteira, que enxergam a
+    mesma fila que o coletor via TraCI.
+    """
+    cfg_path, out_dir = Path(cfg_path), Path(out_dir)
+    root = ET.Element('additional')
+    count = 0
+    has_edge_data = False
+    for name in _cfg_files(ET.parse(cfg_path).getroot(), 'additional-files'):
+        add = cfg_path.parent / name.strip()
+        if not add.exists():
+            logger.warning(f"Adicional do cenário não encontrado: {add}")
+            continue
+        for elem in ET.parse(add).getroot():
+            if elem.get('file'): elem.set('file', str(out_dir / Path(elem.get('file')).name))
+            if elem.tag in ('e2Detector', 'laneAreaDetector'):
+                count += 1
+                if detector_period: elem.set('freq', f"{detector_period:g}")
+            elif elem.tag == 'edgeData':
+                has_edge_data = True
+                if edge_period: elem.set('period', f"{edge_period:g}")
+            root.append(elem)
+    lanes = list(lanes)
+    for lane in lanes:
+        ET.SubElement(root, 'e2Detector', id=stats_detector(lane), lane=lane, pos="0", endPos="-1", friendlyPos="true",
+                      file=str(out_dir / LANE_STATS_OUTPUT), freq=f"{detector_period or 60:g}")
+    if edge_period and not has_edge_data:
+        ET.SubElement(root, 'edgeData', id="edge_data", file=str(out_dir / EDGE_DATA_OUTPUT), period=f"{edge_period:g}", excludeEmpty="true")
+    path = out_dir / RUN_ADDITIONAL
+    ET.ElementTree(root).write(path, encoding='utf-8')
+    logger.info(f"Saídas do SUMO em {out_dir}: {count} detectores e2 do cenário, {len(lanes)} de faixa inteira, edgeData: {has_edge_data or bool(edge_period)}")
+    return path
+
+def aggregate_detectors(path, groups: Dict[str, Iterable[str]], dt: float = 1.0) -> Dict[str, dict]:
+    """Soma as saídas e2 por semáforo: {tid: {'flow', 'sum_q', 'max_lane_q', 'samples'}}.
+
+    sum_q / samples é a fila média (veículos parados) por passo, como no coletor via TraCI. A saída agregada
+    não permite reconstruir o máximo da fila somada por passo; max_lane_q é o maior pico de uma única faixa.
+    """
+    owner = {det: tid for tid, dets in groups.items() for det in dets}
+    # (tid, begin) -> [soma de jam, passos do intervalo]
+    per_interval = defaultdict(lambda: [0.0, 0])
+    flow = defaultdict(int)
+    lane_max = defaultdict(int)
+    for _, elem in ET.iterparse(path):
+        if elem.tag != 'interval': continue
+        tid = owner.get(elem.get('id'))
+        if tid is not None:
+            begin, end = float(elem.get('begin')), float(elem.get('end'))
+            acc = per_interval[(tid, begin)]
+            acc[0] += float(elem.get('jamLengthInVehiclesSum', 0))
+            acc[1] = max(acc[1], int(round((end - begin) / dt)))
+            flow[tid] += int(elem.get('nVehEntered', 0))
+            lane_max[tid] = max(lane_max[tid], int(elem.get('maxJamLengthInVehicles', 0)))
+        elem.clear()
+
+    stats = {tid: {'flow': flow[tid], 'sum_q': 0.0, 'max_lane_q': lane_max[tid], 'samples': 0} for tid in groups if tid in flow}
+    for (tid, _), (jam, steps) in per_interval.items():
+        s = stats[tid]
+        s['sum_q'] += jam
+        s['samples'] += steps
+    return stats
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import threading
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Optional
+
+from tcc_sumo.utils.helpers import get_logger
+
+try:
+    import psutil
+    HAS_PSUTIL = True
+except ImportError:
+    HAS_PSUTIL = False
+
+logger = get_logger("Profiler")
+
+_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+_PAGE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def process_usage(pid: int) -> Optional[dict]:
+    """CPU acumulado (s) e RSS (bytes) de um processo: psutil se houver, senão /proc (Linux)."""
+    try:
+        if HAS_PSUTIL:
+            p = psutil.Process(pid)
+            cpu = p.cpu_times()
+            return {"cpu": cpu.user + cpu.system, "rss": p.memory_info().rss}
+        with open(f"/proc/{pid}/stat") as f: fields = f.read().rsplit(')', 1)[1].split()
+        with open(f"/proc/{pid}/statm") as f: rss_pages = int(f.read().split()[1])
+        # utime e stime são os campos 14 e 15 do stat (11 e 12 depois do nome do processo)
+        return {"cpu": (int(fields[11]) + int(fields[12])) / _TICKS, "rss": rss_pages * _PAGE}
+    except Exception:
+        return None
+
+class StepProfiler:
+    """Tempo por fase do laço, chamadas TraCI por domínio/método e amostras de CPU/RSS (Python e SUMO).
+
+    lap(nome) soma o tempo desde o lap anterior na fase 'nome'; o laço chama lap ao fim de cada fase.
+    Desligado, o laço só testa uma variável local (ver measure_overhead).
+    """
+
+    def __init__(self, sample_interval: float = 1.0):
+        self.sample_interval = sample_interval
+        self.totals = defaultdict(float)
+        self.counts = defaultdict(int)
+        self.calls = Counter()
+        self.samples = []
+        self.sumo_pid = None
+        self.steps = 0
+        self._t = time.perf_counter()
+        self._start = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def lap(self, name):
+        now = time.perf_counter()
+        self.totals[name] += now - self._t
+        self.counts[name] += 1
+        self._t = now
+
+    def start(self, sumo_pid: Optional[int] = None):
+        self.sumo_pid = sumo_pid
+        self._start = self._t = time.perf_counter()
+        self._thread = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample_loop(self):
+        self._sample()
+        while not self._stop.wait(self.sample_interval): self._sample()
+
+    def _sample(self):
+        sample = {"t": round(time.perf_counter() - self._start, 3), "python": process_usage(os.getpid())}
+        if self.sumo_pid: sample["sumo"] = process_usage(self.sumo_pid)
+        self.samples.append(sample)
+
+    def stop(self):
+        if self._thread is None: return
+        self._sample()
+        self._stop.set()
+        self._thread.join(timeout=2.0)
+
+    def report(self, steps: int) -> dict:
+        wall = time.perf_counter() - self._start if self._start else 0.0
+        measured = sum(self.totals.values()) or 1.0
+        phases = {name: {"total_s": round(total, 4), "mean_us": round(total / self.counts[name] * 1e6, 2),
+                         "share": round(total / measured, 4)}
+                  for name, total in sorted(self.totals.items(), key=lambda kv: -kv[1])}
+        calls = {f"{dom}.{meth}": n for (dom, meth), n in self.calls.most_common()}
+        report = {
+            "steps": steps,
+            "wall_time": round(wall, 3),
+            "steps_per_sec": round(steps / wall, 2) if wall else 0.0,
+            "phases": phases,
+            "traci_calls": calls,
+            "traci_calls_per_step": round(sum(self.calls.values()) / steps, 2) if steps else 0.0,
+            "samples": self.samples,
+        }
+        for proc in ("python", "sumo"):
+            usage = [s[proc] for s in self.samples if s.get(proc)]
+            if len(usage) >= 2:
+                report[f"{proc}_cpu_s"] = round(usage[-1]['cpu'] - usage[0]['cpu'], 3)
+                report[f"{proc}_peak_rss_mb"] = round(max(u['rss'] for u in usage) / 2**20, 1)
+        return report
+
+    def write(self, path, steps: int):
+        report = self.report(steps)
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f: json.dump(report, f, indent=4)
+        top = ", ".join(f"{k} {v['share']:.0%}" for k, v in list(report['phases'].items())[:4])
+        logger.info(f"Perfil: {report['steps_per_sec']} passos/s, {report['traci_calls_per_step']} chamadas TraCI/passo ({top}). Relatório: {path}")
+        return report
+
+def measure_overhead(n: int = 1_000_000) -> dict:
+    """Custo por iteração (ns) do gancho desligado, do lap ligado e do proxy TraCI sem e com contagem."""
+    import types
+    from tcc_sumo.simulation.backend import SumoBackend
+
+    def hook(lap):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            if lap: lap("x")
+        return (time.perf_counter() - t0) / n * 1e9
+
+    def proxy(backend):
+        t0 = time.perf_counter()
+        for _ in range(n): backend.lane.getLastStepHaltingNumber
+        return (time.perf_counter() - t0) / n * 1e9
+
+    fake = types.SimpleNamespace(lane=types.SimpleNamespace(getLastStepHaltingNumber=lambda l: 0))
+    plain = SumoBackend()
+    plain._module = fake
+    counted = SumoBackend()
+    counted._module = fake
+    counted.count_calls(Counter())
+    return {
+        "hook_disabled_ns": round(hook(None), 1),
+        "hook_enabled_ns": round(hook(StepProfiler().lap), 1),
+        "proxy_ns": round(proxy(plain), 1),
+        "proxy_counting_ns": round(proxy(counted), 1),
+    }
+
+if __name__ == "__main__":
+    print(json.dumps(measure_overhead(), indent=4))
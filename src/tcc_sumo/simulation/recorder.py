@@ -0,0 +1,129 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import queue
+import threading
+from pathlib import Path
+from typing import List
+
+from tcc_sumo.utils.helpers import get_logger
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
+
+logger = get_logger("SeriesRecorder")
+
+INDEX_FILE = "index.json"
+
+class SeriesRecorder:
+    """Série temporal por semáforo (fila e chegadas por amostra) em buffers NumPy pré-alocados.
+
+    Dois buffers de 'chunk' linhas se alternam: o cheio vai para uma thread que o grava como shard .npz
+    enquanto o laço preenche o outro. A memória não depende da duração da execução. O index.json é regravado
+    (atomicamente) a cada shard: uma execução interrompida deixa a série legível até o último shard.
+    """
+
+    def __init__(self, out_dir, tls_ids: List[str], chunk: int = 3600, state=None):
+        if not HAS_NUMPY: raise RuntimeError("NumPy é necessário para gravar séries temporais.")
+        self.out_dir = Path(out_dir)
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        # Retomada: mantém os shards do checkpoint e descarta os gravados depois dele
+        self.shards = list(state['shards']) if state else []
+        self.rows = state['rows'] if state else 0
+        for old in self.out_dir.glob("shard_*.npz"):
+            if old.name not in self.shards: old.unlink()
+        self.tls_ids = list(tls_ids)
+        self.columns = {tid: i for i, tid in enumerate(self.tls_ids)}
+        self.chunk = chunk
+        self._unknown = set()
+
+        self._free = queue.Queue()
+        for _ in range(2): self._free.put(self._alloc())
+        self._pending = queue.Queue()
+        self._buf = self._free.get()
+        self._pos = 0
+        self._writer = threading.Thread(target=self._write_loop, name="series-writer", daemon=True)
+        self._writer.start()
+
+    def _alloc(self):
+        n = len(self.tls_ids)
+        return {
+            'step': np.zeros(self.chunk, dtype=np.int32),
+            'queue': np.zeros((self.chunk, n), dtype=np.int32),
+            'arrivals': np.zeros((self.chunk, n), dtype=np.int32),
+        }
+
+    def set(self, tid, q, arrivals):
+        col = self.columns.get(tid)
+        if col is None:
+            if tid not in self._unknown:
+                self._unknown.add(tid)
+                logger.warning(f"{tid} fora das colunas da série temporal: amostras descartadas.")
+            return
+        self._buf['queue'][self._pos, col] = q
+        self._buf['arrivals'][self._pos, col] = arrivals
+
+    def commit(self, step):
+        self._buf['step'][self._pos] = step
+        self._pos += 1
+        if self._pos == self.chunk: self._flush()
+
+    def _flush(self):
+        if not self._pos: return
+        self.shards.append(f"shard_{len(self.shards):05d}.npz")
+        self.rows += self._pos
+        self._pending.put((len(self.shards) - 1, self._buf, self._pos, list(self.shards), self.rows))
+        # Bloqueia só se o escritor ainda não liberou o buffer anterior
+        self._buf = self._free.get()
+        self._buf['queue'].fill(0)
+        self._buf['arrivals'].fill(0)
+        self._pos = 0
+
+    def _write_loop(self):
+        while True:
+            item = self._pending.get()
+            if item is None: break
+            idx, buf, n, shards, rows = item
+            try:
+                np.savez(self.out_dir / f"shard_{idx:05d}.npz", step=buf['step'][:n], queue=buf['queue'][:n], arrivals=buf['arrivals'][:n])
+                self._write_index(shards, rows)
+            except Exception as e:
+                logger.error(f"Falha ao gravar shard {idx}: {e}")
+            self._free.put(buf)
+            self._pending.task_done()
+
+    def _write_index(self, shards, rows):
+        tmp = self.out_dir / f"{INDEX_FILE}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump({"tls_ids": self.tls_ids, "chunk": self.chunk, "rows": rows, "shards": shards}, f, indent=4)
+        os.replace(tmp, self.out_dir / INDEX_FILE)
+
+    def checkpoint(self):
+        # Fecha o shard corrente e espera o escritor: os shards listados já estão no disco
+        self._flush()
+        self._pending.join()
+        return {"shards": list(self.shards), "rows": self.rows}
+
+    def close(self):
+        self._flush()
+        self._pending.put(None)
+        self._writer.join()
+        self._write_index(self.shards, self.rows)
+        logger.info(f"Série temporal gravada: {self.rows} amostras em {len(self.shards)} shards ({self.out_dir}).")
+
+def load_series(series_dir):
+    """Lê os shards de volta: {'tls_ids', 'step' (T,), 'queue' (T, N), 'arrivals' (T, N)}."""
+    series_dir = Path(series_dir)
+    with open(series_dir / INDEX_FILE) as f: index = json.load(f)
+    parts = {'step': [], 'queue': [], 'arrivals': []}
+    for name in index['shards']:
+        with np.load(series_dir / name) as shard:
+            for k in parts: parts[k].append(shard[k])
+    n = len(index['tls_ids'])
+    empty = {'step': np.zeros(0, dtype=np.int32), 'queue': np.zeros((0, n), dtype=np.int32), 'arrivals': np.zeros((0, n), dtype=np.int32)}
+    data = {k: (np.concatenate(v) if v else empty[k]) for k, v in parts.items()}
+    data['tls_ids'] = index['tls_ids']
+    return data
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+import gzip
+import pickle
+import random
+import zlib
+from pathlib import Path
+
+from tcc_sumo.utils.helpers import get_logger
+
+logger = get_logger("TraceReplay")
+
+TRACE_VERSION = 3
+
+# Domínios TraCI: em replay viram objetos com métodos; o resto do topo (simulationStep, ...) vira função
+DOMAINS = frozenset((
+    'simulation', 'vehicle', 'vehicletype', 'person', 'route', 'edge', 'lane', 'junction', 'trafficlight', 'gui', 'poi',
+    'polygon', 'inductionloop', 'lanearea', 'multientryexit', 'calibrator', 'busstop', 'parkingarea', 'chargingstation',
+    'overheadwire', 'rerouter', 'variablespeedsign', 'meandata', 'routeprobe'
+))
+
+def call_digest(args, kwargs) -> int:
+    """CRC32 dos argumentos da chamada: o trace confere os argumentos sem guardá-los inteiros.
+
+    Pelo repr e não pelo pickle, cujo memo depende da identidade dos objetos (duas strings iguais != a mesma string).
+    """
+    return zlib.crc32(repr((args, sorted(kwargs.items()))).encode())
+
+class ReplayDivergence(RuntimeError):
+    """A execução em replay pediu uma chamada diferente da gravada: o Python não está reproduzindo a gravação."""
+
+class ReplayExhausted(EOFError):
+    """O trace acabou antes da execução em replay."""
+
+class TraceWriter:
+    """Observador do backend: grava cada resposta TraCI (chave, digest dos argumentos, ok, valor) em blocos pickle num .gz.
+
+    O primeiro bloco é o cabeçalho com o estado do random e as linhas dos dispositivos, para o replay tomar as
+    mesmas decisões sem consultar a base.
+    """
+
+    def __init__(self, path, devices=None, chunk: int = 4096):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.chunk = chunk
+        self.count = 0
+        self._buf = []
+        self._f = gzip.open(self.path, 'wb', compresslevel=6)
+        pickle.dump({"version": TRACE_VERSION, "random": random.getstate(), "devices": list(devices or [])}, self._f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def __call__(self, key, args, kwargs, ok, value):
+        # O valor é serializado já: o traci reaproveita e reescreve no lugar o dict de getAllSubscriptionResults
+        self._buf.append((key, call_digest(args, kwargs), ok, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)))
+        if len(self._buf) >= self.chunk: self._flush()
+
+    def _flush(self):
+        if not self._buf: return
+        # Um dump por bloco: o memo do pickle compartilha as chaves repetidas dentro do bloco
+        pickle.dump(self._buf, self._f, protocol=pickle.HIGHEST_PROTOCOL)
+        self.count += len(self._buf)
+        self._buf = []
+
+    def close(self):
+        self._flush()
+        self._f.close()
+        logger.info(f"Trace TraCI gravado: {self.count} respostas em {self.path} ({self.path.stat().st_size / 2**20:.1f} MiB).")
+
+def _load_header(f) -> dict:
+    header = pickle.load(f)
+    if header.get('version') != TRACE_VERSION: raise ValueError(f"Versão de trace não suportada: {header.get('version')}")
+    return header
+
+def read_header(path) -> dict:
+    with gzip.open(path, 'rb') as f: return _load_header(f)
+
+def read_trace(path):
+    """Retorna (cabeçalho, iterador de (chave, digest, ok, valor))."""
+    f = gzip.open(path, 'rb')
+    header = _load_header(f)
+
+    def entries():
+        with f:
+            while True:
+                try: block = pickle.load(f)
+                except EOFError: return
+                for key, digest, ok, value in block: yield key, digest, ok, pickle.loads(value)
+
+    return header, entries()
+
+class _ReplayDomain:
+    def __init__(self, module, name):
+        self._module = module
+        self._name = name
+
+    def __getattr__(self, attr):
+        # Classes auxiliares (Phase, Logic, ...) não falam com o SUMO: vêm do pacote traci, se instalado
+        if attr[:1].isupper():
+            import traci as real
+            return getattr(getattr(real, self._name), attr)
+        key = (self._name, attr)
+        return lambda *args, **kwargs: self._module.next(key, args, kwargs)
+
+class ReplayModule:
+    """Substituto do módulo traci/libsumo que devolve, em ordem, as respostas de um trace gravado."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.header, self._entries = read_trace(self.path)
+        self.served = 0
+
+    def next(self, key, args=(), kwargs=None):
+        entry = next(self._entries, None)
+        if entry is None: raise ReplayExhausted(f"Trace esgotado após {self.served} respostas (pedido {key[0]}.{key[1]}).")
+        recorded, digest, ok, value = entry
+        if recorded != key:
+            raise ReplayDivergence(f"Resposta {self.served}: gravado {recorded[0]}.{recorded[1]}, pedido {key[0]}.{key[1]}.")
+        if digest != call_digest(args, kwargs or {}):
+            raise ReplayDivergence(f"Resposta {self.served}: {key[0]}.{key[1]} chamado com argumentos diferentes dos gravados {args}.")
+        self.served += 1
+        if not ok: raise value
+        return value
+
+    def start(self, *args, **kwargs):
+        random.setstate(self.header['random'])
+        logger.info(f"Replay de {self.path}: sem SUMO, respostas servidas do trace.")
+
+    def init(self, *args, **kwargs):
+        self.start()
+
+    def close(self, *args, **kwargs):
+        logger.info(f"Replay encerrado: {self.served} respostas servidas.")
+
+    def __getattr__(self, attr):
+        if attr.startswith('__'): raise AttributeError(attr)
+        if attr in DOMAINS: return _ReplayDomain(self, attr)
+        key = ('traci', attr)
+        return lambda *args, **kwargs: self.next(key, args, kwargs)
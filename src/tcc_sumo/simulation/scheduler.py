@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+import heapq
+import itertools
+
+class EventScheduler:
+    """Heap de despertares (passo, chave): o laço salta direto para o próximo evento e despacha só o que venceu."""
+
+    def __init__(self):
+        self._heap = []
+        self._seq = itertools.count()
+
+    def schedule(self, step, key):
+        if step is None: return
+        heapq.heappush(self._heap, (step, next(self._seq), key))
+
+    def next_step(self):
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, step):
+        due = []
+        while self._heap and self._heap[0][0] <= step:
+            due.append(heapq.heappop(self._heap)[2])
+        return due
+
+    def __len__(self):
+        return len(self._heap)
@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+import atexit
+import itertools
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import List, Optional
+
+from tcc_sumo.utils.helpers import get_logger
+from tcc_sumo.simulation.backend import traci
+from tcc_sumo.simulation.native_outputs import output_args, write_run_additional
+from tcc_sumo.simulation.traci_connection import find_free_port, connect_when_ready
+
+logger = get_logger("SumoServerPool")
+
+# Diretório temporário (por servidor) que recebe as saídas do .sumocfg enquanto o servidor está estacionado
+PARKED_PREFIX = "pool_parked_"
+
+def strip_outputs(args: List[str]) -> List[str]:
+    # Remove pares '--xxx-output caminho' e os adicionais da execução (saídas redirecionadas dos detectores):
+    # o estacionamento não pode sobrescrever as saídas da execução anterior
+    out, skip = [], False
+    for a in args:
+        if skip:
+            skip = False
+            continue
+        if a.startswith('--') and (a.endswith('-output') or a == '--additional-files'):
+            skip = True
+            continue
+        out.append(a)
+    return out
+
+class SumoServer:
+    """Processo SUMO de longa duração com a sua própria conexão TraCI rotulada."""
+
+    _labels = itertools.count()
+
+    def __init__(self, sumo_cmd: List[str], ready_timeout: float):
+        self.port = find_free_port()
+        self.label = f"pool{next(self._labels)}"
+        self.binary = sumo_cmd[0]
+        self.args = sumo_cmd[1:]
+        self.runs = 0
+        self.parked_dir = None
+        cmd = sumo_cmd + ["--remote-port", str(self.port)]
+        logger.info(f"Iniciando servidor SUMO do pool ({self.label}, porta {self.port}).")
+        self.process = subprocess.Popen(cmd, stdout=sys.stdout, stderr=sys.stderr)
+        try: connect_when_ready(self.port, self.process, ready_timeout, label=self.label)
+        except Exception:
+            self.kill()
+            raise
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def load(self, args: List[str]):
+        traci.switch(self.label)
+        traci.load(args)
+        self.args = list(args)
+        # Sanidade: uma consulta barata confirma que o servidor respondeu ao load
+        traci.simulation.getTime()
+
+    def park(self):
+        """Recarrega sem as saídas da execução: o SUMO só fecha os arquivos ao encerrar a simulação.
+
+        As saídas do próprio .sumocfg (tripinfo, detectores, edgeData) vão para um diretório temporário do servidor,
+        nunca para o diretório do cenário.
+        """
+        if self.parked_dir is None: self.parked_dir = tempfile.mkdtemp(prefix=PARKED_PREFIX)
+        args = strip_outputs(self.args)
+        cfg = args[args.index("-c") + 1] if "-c" in args else None
+        if cfg:
+            args += output_args(cfg, self.parked_dir)
+            args += ["--additional-files", str(write_run_additional(cfg, self.parked_dir))]
+        self.load(args)
+
+    def close(self):
+        try:
+            traci.switch(self.label)
+            traci.close()
+        except Exception: pass
+        self.kill()
+        if self.parked_dir: shutil.rmtree(self.parked_dir, ignore_errors=True)
+
+    def kill(self):
+        if self.process.poll() is None:
+            self.process.terminate()
+            try: self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired: self.process.kill()
+
+class SumoServerPool:
+    """Servidores SUMO reaproveitados entre execuções via traci.load (um processo Python, uma execução por vez).
+
+    O primeiro acquire inicia o processo com o cenário pedido; os seguintes recarregam (sempre: um servidor
+    estacionado já rodou e tem outras saídas). Servidores que falham no load ou passam de max_runs execuções são
+    descartados e recriados. O release estaciona o servidor com uma recarga extra, que fecha os arquivos de saída
+    da execução.
+    """
+
+    def __init__(self, size: int = 1, max_runs: int = 50, ready_timeout: float = 30.0):
+        self.size = max(1, size)
+        self.max_runs = max_runs
+        self.ready_timeout = ready_timeout
+        self.idle: List[SumoServer] = []
+        self.busy: List[SumoServer] = []
+        self.spawned = 0
+        self.reuses = 0
+
+    def acquire(self, sumo_cmd: List[str]) -> SumoServer:
+        binary, args = sumo_cmd[0], sumo_cmd[1:]
+        while self.idle:
+            server = self.idle.pop()
+            if not server.alive() or server.binary != binary:
+                server.close()
+                continue
+            try: server.load(args)
+            except Exception as e:
+                logger.warning(f"Servidor {server.label} não respondeu ao load ({e}): reciclando.")
+                server.close()
+                continue
+            self.reuses += 1
+            return self._lease(server)
+        server = SumoServer(sumo_cmd, self.ready_timeout)
+        self.spawned += 1
+        return self._lease(server)
+
+    def _lease(self, server):
+        traci.switch(server.label)
+        server.runs += 1
+        self.busy.append(server)
+        return server
+
+    def release(self, server: SumoServer):
+        self.busy = [s for s in self.busy if s is not server]
+        if not server.alive() or server.runs >= self.max_runs or len(self.idle) >= self.size:
+            server.close()
+            return
+        try: server.park()
+        except Exception as e:
+            logger.warning(f"Servidor {server.label} falhou ao estacionar ({e}): reciclando.")
+            server.close()
+            return
+        self.idle.append(server)
+
+    def shutdown(self):
+        for server in self.idle + self.busy: server.close()
+        if self.spawned: logger.info(f"Pool SUMO encerrado: {self.spawned} processos iniciados, {self.reuses} reaproveitamentos.")
+        self.idle, self.busy = [], []
+
+_POOL: Optional[SumoServerPool] = None
+
+def get_pool(size: int = 1, max_runs: int = 50, ready_timeout: float = 30.0) -> SumoServerPool:
+    """Pool do processo atual (cada worker do runner tem o seu), encerrado no atexit."""
+    global _POOL
+    if _POOL is None:
+        _POOL = SumoServerPool(size, max_runs, ready_timeout)
+        atexit.register(_POOL.shutdown)
+    return _POOL
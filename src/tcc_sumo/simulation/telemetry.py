@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+from collections import defaultdict
+
+from tcc_sumo.utils.helpers import get_logger
+from tcc_sumo.simulation.backend import traci
+
+logger = get_logger("Telemetry")
+
+class SubscriptionHub:
+    """Centraliza as subscrições TraCI: subscreve uma vez no setup e lê tudo num único lote por passo."""
+
+    def __init__(self):
+        self.requests = defaultdict(dict)
+        self.results = {}
+
+    def require(self, domain, obj_ids, var_ids):
+        # Variáveis pedidas por vários consumidores para o mesmo objeto são unidas numa só subscrição
+        objs = self.requests[domain]
+        for oid in obj_ids:
+            objs.setdefault(oid, set()).update(var_ids)
+
+    def subscribe(self):
+        total = 0
+        for domain, objs in self.requests.items():
+            api = getattr(traci, domain)
+            for oid, var_ids in objs.items():
+                api.subscribe(oid, sorted(var_ids))
+                total += 1
+        logger.info(f"Subscrições TraCI ativas: {total} objetos.")
+
+    def refresh(self):
+        for domain in self.requests:
+            self.results[domain] = getattr(traci, domain).getAllSubscriptionResults()
+
+    def domain(self, domain):
+        return self.results.get(domain, {})
+
+    def get(self, domain, oid, var_id, default=None):
+        return self.results.get(domain, {}).get(oid, {}).get(var_id, default)
@@ -1,57 +1,100 @@
 # -*- coding: utf-8 -*-
 import logging
+import socket
 import subprocess
 import time
 import sys
-import traci
 from traci.exceptions import TraCIException
 
 from tcc_sumo.utils.helpers import get_logger
+from tcc_sumo.simulation.backend import traci
 
 logger = get_logger("tcc_sumo.simulation.traci_connection")
 
+def find_free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("localhost", 0))
+        return s.getsockname()[1]
+
+def connect_when_ready(port: int, process=None, timeout: float = 30.0, label: str = "default") -> None:
+    """Tenta traci.init com espera crescente (50 ms -> 1 s) até o SUMO aceitar; falha na hora se o processo morrer."""
+    deadline = time.monotonic() + timeout
+    delay = 0.05
+    while True:
+        try:
+            traci.init(port, numRetries=0, label=label)
+            return
+        except (TraCIException, ConnectionError, OSError) as e:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"SUMO encerrou antes de aceitar a conexão (código {process.returncode}).") from e
+            if time.monotonic() + delay > deadline:
+                raise RuntimeError(f"SUMO não aceitou conexão TraCI na porta {port} em {timeout:.0f}s: {e}") from e
+        time.sleep(delay)
+        delay = min(delay * 2, 1.0)
+
 class TraciConnection:
-    def __init__(self, sumo_executable: str, config_file: str, port: int):
+    def __init__(self, sumo_executable: str, config_file: str, port: int, backend: str = 'traci', cwd=None, extra_args=None, trace=None,
+                 pool=None):
         self.sumo_executable = sumo_executable
         self.config_file = config_file
         self.port = port
+        self.backend = backend
+        self.cwd = cwd
+        self.extra_args = list(extra_args or [])
+        self.trace = trace
+        self.pool = pool
+        self.server = None
         self.sumo_process = None
 
     def start(self) -> None:
+        traci.select(self.backend, trace=self.trace)
         sumo_cmd = [
             self.sumo_executable,
             "-c", self.config_file,
-            "--remote-port", str(self.port),
             "--start",
             "--quit-on-end",
             "--time-to-teleport", "-1",
             "--no-warnings", "true"
-        ]
+        ] + self.extra_args
+        if traci.in_process:
+            # libsumo roda o SUMO dentro deste processo (replay nem roda): sem socket, sem GUI
+            sumo_cmd[0] = "sumo"
+            logger.info(f"Iniciando SUMO em processo ({traci.name}): {' '.join(sumo_cmd)}")
+            traci.start(sumo_cmd)
+            return
+
+        if self.pool is not None:
+            # Servidor já aquecido do pool: traci.load troca o cenário sem criar processo
+            self.server = self.pool.acquire(sumo_cmd)
+            self.sumo_process = None
+            return
+
+        sumo_cmd += ["--remote-port", str(self.port)]
         logger.info(f"Iniciando processo do SUMO: {' '.join(sumo_cmd)}")
 
-        self.sumo_process = subprocess.Popen(sumo_cmd, stdout=sys.stdout, stderr=sys.stderr)
+        self.sumo_process = subprocess.Popen(sumo_cmd, cwd=self.cwd, stdout=sys.stdout, stderr=sys.stderr)
+        try:
+            connect_when_ready(self.port, self.sumo_process)
+            logger.info(f"Conexão TraCI estabelecida na porta {self.port}.")
+        except RuntimeError as e:
+            logger.critical(f"Falha ao estabelecer conexão TraCI: {e}")
+            self.close()
+            raise RuntimeError("Não foi possível conectar ao SUMO via TraCI.") from e
 
-        retries = 10
-        for i in range(retries):
-            try:
-                traci.init(self.port)
-                logger.info(f"Conexão TraCI estabelecida na porta {self.port}.")
-                return
-            except TraCIException as e:
-                if i < retries - 1:
-                    logger.warning(f"Tentativa {i+1}/{retries}: Não foi possível conectar ao TraCI na porta {self.port}. Tentando novamente em 1s...")
-                    time.sleep(1)
-                else:
-                    logger.critical(f"Falha ao estabelecer conexão TraCI após {retries} tentativas: {e}")
-        
-        self.close()
-        raise RuntimeError("Não foi possível conectar ao SUMO via TraCI.")
+    @property
+    def pid(self):
+        if self.server is not None: return self.server.process.pid
+        return self.sumo_process.pid if self.sumo_process else None
 
     def close(self) -> None:
+        if self.server is not None:
+            self.pool.release(self.server)
+            self.server = None
+            return
         try:
             traci.close()
             logger.info("Conexão TraCI encerrada.")
-        except (TraCIException, AttributeError):
+        except Exception:
             logger.debug("Tentativa de fechar uma conexão TraCI já inexistente ou não inicializada.")
         finally:
             if self.sumo_process and self.sumo_process.poll() is None:
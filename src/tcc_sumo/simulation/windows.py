@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+import json
+import time
+from pathlib import Path
+from typing import Iterable
+
+from tcc_sumo.utils.helpers import get_logger
+from tcc_sumo.utils.sketches import QueueHistogram
+
+logger = get_logger("WindowTickets")
+
+class _WindowStats:
+    __slots__ = ('hist', 'sum_q', 'max_q', 'arrivals')
+
+    def __init__(self, cap):
+        self.hist = QueueHistogram(cap)
+        self.sum_q = 0
+        self.max_q = 0
+        self.arrivals = 0
+
+    def add(self, q, arrivals):
+        self.hist.add(q)
+        self.sum_q += q
+        if q > self.max_q: self.max_q = q
+        self.arrivals += arrivals
+
+class WindowAggregator:
+    """Janelas fixas (ex.: 5 e 15 min) por semáforo, emitidas como tickets JSONL durante a execução.
+
+    Tamanhos, início e fim das janelas em segundos de simulação: o passo é convertido com dt (--step-length).
+    Cada janela guarda só um histograma limitado e somatórios: a memória não depende da duração.
+    Cada linha é gravada e descarregada ao fechar a janela, então uma execução interrompida mantém as anteriores.
+    """
+
+    def __init__(self, out_file, sizes: Iterable[int], scenario: str, mode: str, device_map=None, hist_cap: int = 256,
+                 dt: float = 1.0, state=None):
+        self.out_file = Path(out_file)
+        self.out_file.parent.mkdir(parents=True, exist_ok=True)
+        self.sizes = sorted({int(s) for s in sizes if int(s) > 0})
+        self.scenario = scenario
+        self.mode = mode
+        self.device_map = device_map or {}
+        self.hist_cap = hist_cap
+        self.dt = dt
+        self.current = {size: None for size in self.sizes}
+        self.stats = {size: {} for size in self.sizes}
+        self.emitted = 0
+        if state is None:
+            self._f = open(self.out_file, 'w')
+            return
+        # Retomada: descarta as linhas gravadas depois do checkpoint e continua as janelas abertas
+        self.current, self.stats, self.emitted = state['current'], state['stats'], state['emitted']
+        self._f = open(self.out_file, 'r+' if self.out_file.exists() else 'w')
+        self._f.truncate(state['offset'])
+        self._f.seek(state['offset'])
+
+    def get_state(self):
+        self._f.flush()
+        return {"current": self.current, "stats": self.stats, "emitted": self.emitted, "offset": self._f.tell()}
+
+    def add(self, tid, q, arrivals):
+        for size in self.sizes:
+            st = self.stats[size].get(tid)
+            if st is None: st = self.stats[size][tid] = _WindowStats(self.hist_cap)
+            st.add(q, arrivals)
+
+    def _seconds(self, step):
+        # Arredondado: com dt fracionário, step * dt pode cair um ulp abaixo do limite da janela
+        return round(step * self.dt, 6)
+
+    def advance(self, step):
+        # Chamado antes das amostras do passo: fecha as janelas que terminaram antes dele
+        for size in self.sizes:
+            idx = int(self._seconds(step) // size)
+            if self.current[size] is None: self.current[size] = idx
+            elif idx != self.current[size]: self._emit(size, step)
+
+    def _emit(self, size, step, partial=False):
+        idx = self.current[size]
+        start = idx * size
+        end = min(start + size, self._seconds(step)) if partial else start + size
+        partial = end < start + size
+        stats = self.stats[size]
+        for tid, st in stats.items():
+            n = st.hist.count
+            if not n: continue
+            dev = self.device_map.get(tid, {})
+            ticket = {
+                "sumo_id": tid,
+                "tls_mac": dev.get('id', 'N/A'),
+                "camera_mac": dev.get('camera', {}).get('id', 'N/A'),
+                "source": f"from_{self.scenario}",
+                "window": {"size": size, "start": start, "end": end, "partial": partial},
+                "metrics": {
+                    "flow_count": st.arrivals,
+                    "max_queue": st.max_q,
+                    "avg_queue": round(st.sum_q / n, 2),
+                    "p50_queue": st.hist.quantile(0.5),
+                    "p95_queue": st.hist.quantile(0.95)
+                },
+                "mode": self.mode,
+                "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
+            }
+            self._f.write(json.dumps(ticket) + "\n")
+            self.emitted += 1
+        self._f.flush()
+        self.stats[size] = {}
+        self.current[size] = int(self._seconds(step) // size)
+
+    def close(self, step):
+        for size in self.sizes:
+            if self.current[size] is not None and self.stats[size]: self._emit(size, step, partial=True)
+        self._f.close()
+        logger.info(f"Tickets por janela ({self.sizes}s): {self.emitted} em {self.out_file}")
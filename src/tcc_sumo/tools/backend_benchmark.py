@@ -0,0 +1,94 @@
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+
+if 'SUMO_HOME' in os.environ:
+    tools = os.path.join(os.environ['SUMO_HOME'], 'tools')
+    if tools not in sys.path: sys.path.append(tools)
+
+import traci.constants as tc
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2]))
+from tcc_sumo.utils.helpers import get_logger, setup_logging, PROJECT_ROOT
+from tcc_sumo.simulation.backend import traci, BACKENDS
+from tcc_sumo.simulation.traci_connection import TraciConnection
+from tcc_sumo.simulation.telemetry import SubscriptionHub
+from tcc_sumo.traffic_logic.controllers import StaticController, AdaptiveController
+from tcc_sumo.traffic_logic.topology import TopologyIndex
+
+setup_logging()
+logger = get_logger("BackendBenchmark")
+
+SCENARIOS = {
+    'api': PROJECT_ROOT / "scenarios/from_api/api.sumocfg",
+    'osm': PROJECT_ROOT / "scenarios/from_osm/osm.sumocfg",
+}
+
+def bench_backend(backend, cfg_path, mode, steps, port, trace=None):
+    """Mede passos/s do ciclo simulationStep + controlador + telemetria num backend."""
+    conn = TraciConnection("sumo", str(cfg_path), port, backend=backend, trace=trace)
+    conn.start()
+    try:
+        topology = TopologyIndex.build(traci.trafficlight.getIDList())
+        ctrl = AdaptiveController() if mode == 'ADAPTIVE' else StaticController()
+        ctrl.setup(list(topology), topology)
+
+        hub = SubscriptionHub()
+        lanes = sorted({l for tid in topology for l in topology[tid].lanes})
+        hub.require('lane', lanes, [tc.LAST_STEP_VEHICLE_HALTING_NUMBER, tc.LAST_STEP_VEHICLE_ID_LIST])
+        hub.subscribe()
+
+        step = 0
+        t0 = time.perf_counter()
+        while step < steps and traci.simulation.getMinExpectedNumber() > 0:
+            traci.simulationStep()
+            hub.refresh()
+            ctrl.manage_traffic_lights(step)
+            step += 1
+        elapsed = time.perf_counter() - t0
+    finally:
+        conn.close()
+
+    return {"backend": backend, "steps": step, "seconds": round(elapsed, 3), "steps_per_sec": round(step / elapsed, 2) if elapsed else 0.0}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', default='api', choices=list(SCENARIOS))
+    parser.add_argument('--mode', default='STATIC', choices=['STATIC', 'ADAPTIVE'])
+    parser.add_argument('--steps', type=int, default=3600)
+    parser.add_argument('--port', type=int, default=8813)
+    parser.add_argument('--backends', nargs='+', default=None, choices=list(BACKENDS))
+    parser.add_argument('--trace', default=None, help="Trace gravado (record_trace) para medir o backend replay")
+    args = parser.parse_args()
+    # 'replay' só entra com um trace: sem ele o backend não tem de onde servir as respostas
+    if args.backends is None: args.backends = ['traci', 'libsumo'] + (['replay'] if args.trace else [])
+    if 'replay' in args.backends and not args.trace: parser.error("o backend replay exige --trace")
+
+    cfg_path = SCENARIOS[args.scenario]
+    if not cfg_path.exists():
+        logger.critical(f"Cenário não encontrado: {cfg_path}")
+        sys.exit(1)
+
+    results = []
+    for backend in args.backends:
+        logger.info(f"Benchmark [{backend}] em {cfg_path.name} ({args.steps} passos)...")
+        res = bench_backend(backend, cfg_path, args.mode, args.steps, args.port, trace=args.trace)
+        logger.info(f"[{backend}] {res['steps']} passos em {res['seconds']}s -> {res['steps_per_sec']} passos/s")
+        results.append(res)
+
+    by_name = {r['backend']: r for r in results}
+    if 'traci' in by_name and 'libsumo' in by_name and by_name['traci']['steps_per_sec']:
+        gain = by_name['libsumo']['steps_per_sec'] / by_name['traci']['steps_per_sec']
+        logger.info(f"Ganho libsumo vs traci: {gain:.2f}x")
+
+    out_file = PROJECT_ROOT / "output" / f"{args.scenario}_backend_benchmark.json"
+    out_file.parent.mkdir(exist_ok=True)
+    with open(out_file, 'w') as f:
+        json.dump({"scenario": args.scenario, "mode": args.mode, "results": results, "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")}, f, indent=4)
+    logger.info(f"Resultado salvo em: {out_file}")
+
+if __name__ == "__main__":
+    main()
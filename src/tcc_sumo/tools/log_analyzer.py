@@ -16,13 +16,14 @@ LOGS_DIR = PROJECT_ROOT / "logs"
 OUTPUT_DIR = PROJECT_ROOT / "output"
 
 class LogAnalyzer:
-    def __init__(self, mode="N/A"):
+    def __init__(self, mode="N/A", trip_info=None, scen_path=None, edge_data=None):
         self.mode = mode
         self.ticket_file = LOGS_DIR / "ticket.log"
         self.json_file = OUTPUT_DIR / "consolidated_data.json"
-        self.scen_path = self._find_latest_scenario_path()
-        self.trip_info = self.scen_path / "tripinfo.xml" if self.scen_path else None
-        self.edge_data = self.scen_path / "edge_data.xml" if self.scen_path else None
+        self.scen_path = Path(scen_path) if scen_path else self._find_latest_scenario_path()
+        # tripinfo explícito: execuções isoladas (headless/experimentos) gravam fora do cenário
+        self.trip_info = Path(trip_info) if trip_info else (self.scen_path / "tripinfo.xml" if self.scen_path else None)
+        self.edge_data = Path(edge_data) if edge_data else (self.scen_path / "edge_data.xml" if self.scen_path else None)
         self.net_file = list(self.scen_path.glob("*.net.xml"))[0] if self.scen_path else None
 
     def _find_latest_scenario_path(self):
@@ -34,6 +35,10 @@ class LogAnalyzer:
             return api if api_t.stat().st_mtime > osm_t.stat().st_mtime else osm
         return api if api_t.exists() else (osm if osm_t.exists() else None)
 
+    def collect(self):
+        if not self.trip_info or not self.trip_info.exists(): return {}
+        return self._calculate_metrics()
+
     def run(self):
         if not self.trip_info or not self.trip_info.exists(): return
         metrics = self._calculate_metrics()
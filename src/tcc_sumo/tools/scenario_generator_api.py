@@ -81,9 +81,6 @@ class ScenarioGeneratorAPI:
         base_file = PROJECT_ROOT / "scenarios" / "base_files" / input_file_name
         self.settings = self._load_config(base_file, num_vehicles, duration)
         
-        # Limpa o banco apenas dos DISPOSITIVOS (mantém a rede viária se quiser cachear no futuro)
-        self._clear_devices_db()
-        
         output_dir = PROJECT_ROOT / "scenarios" / "from_api"
         validation_dir = PROJECT_ROOT / "output"
         validation_dir.mkdir(exist_ok=True)
@@ -271,16 +268,9 @@ class ScenarioGeneratorAPI:
             popup = f"<b>{r['name']}</b><br><span style='font-size:9px;color:#666'>ID: {r['id']}</span>"
             line_js = f"var line = L.polyline([{pts}], {{color: '{r['style']['c']}', weight: {r['style']['w']}, opacity: 0.8, lineCap: 'round'}}).bindPopup(\"{popup}\"); roadLayer.addLayer(line);"
             js_roads.append(line_js)
-        html = f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>Fidelity Map</title><meta name="viewport" content="width=device-width, initial-scale=1.0" /><link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/><script src="https://cdn.jsdelivr.net/npm/@supabase/supabase-js@2"></script><script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script><link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600&family=Material+Icons&display=swap" rel="stylesheet"><style>body {{ margin:0; font-family:'Inter', sans-serif; background:#1e1e1e; overflow:hidden; }} #map {{ width:100vw; height:100vh; }} .leaflet-popup-content {{ font-size: 13px; }}</style></head><body><div id="map"></div><script>const sbUrl = '{SB_URL}'; const sbKey = '{SB_KEY}'; const client = supabase.createClient(sbUrl, sbKey); var map = L.map('map', {{ zoomControl: false }}).setView([{lat}, {lon}], 15); L.tileLayer('https://{{s}}.basemaps.cartocdn.com/dark_all/{{z}}/{{x}}/{{y}}{{r}}.png', {{maxZoom:20}}).addTo(map); var roadLayer = L.layerGroup().addTo(map); {"".join(js_roads)} async function loadDevices() {{ const {{ data }} = await client.from('dispositivos').select('*'); if (!data) return; data.forEach(d => {{ if(!d.latitude) return; let color = d.tipo === 'SEMAFARO' ? '#ef4444' : '#3b82f6'; L.circleMarker([d.latitude, d.longitude], {{ radius: 6, color: color, fillColor: color, fillOpacity: 0.8 }}).addTo(map).bindPopup(d.tipo + '<br>' + d.mac_address); }}); }} loadDevices();</script></body></html>"""
+        html = f"""<!DOCTYPE html><html><head><meta charset="utf-8"><title>Fidelity Map</title><meta name="viewport" content="width=device-width, initial-scale=1.0" /><link rel="stylesheet" href="https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"/><script src="https://cdn.jsdelivr.net/npm/@supabase/supabase-js@2"></script><script src="https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"></script><link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;600&family=Material+Icons&display=swap" rel="stylesheet"><style>body {{ margin:0; font-family:'Inter', sans-serif; background:#1e1e1e; overflow:hidden; }} #map {{ width:100vw; height:100vh; }} .leaflet-popup-content {{ font-size: 13px; }}</style></head><body><div id="map"></div><script>const sbUrl = '{SB_URL}'; const sbKey = '{SB_KEY}'; const client = supabase.createClient(sbUrl, sbKey); var map = L.map('map', {{ zoomControl: false }}).setView([{lat}, {lon}], 15); L.tileLayer('https://{{s}}.basemaps.cartocdn.com/dark_all/{{z}}/{{x}}/{{y}}{{r}}.png', {{maxZoom:20}}).addTo(map); var roadLayer = L.layerGroup().addTo(map); {"".join(js_roads)} async function loadDevices() {{ const {{ data }} = await client.from('dispositivos').select('*').is('deleted_at', null); if (!data) return; data.forEach(d => {{ if(!d.latitude) return; let color = d.tipo === 'SEMAFARO' ? '#ef4444' : '#3b82f6'; L.circleMarker([d.latitude, d.longitude], {{ radius: 6, color: color, fillColor: color, fillOpacity: 0.8 }}).addTo(map).bindPopup(d.tipo + '<br>' + d.mac_address); }}); }} loadDevices();</script></body></html>"""
         with open(fp, 'w', encoding='utf-8') as f: f.write(html)
 
-    def _clear_devices_db(self):
-        if not HAS_SUPABASE or not SB_URL or not SB_KEY: return
-        try:
-            client = create_client(SB_URL, SB_KEY)
-            client.table("dispositivos").delete().neq("mac_address", "0").execute()
-        except: pass
-
     def _sync_devices_db(self):
         # Usa script existente ou lógica direta
         sync = PROJECT_ROOT / "src" / "sync_db.py"
@@ -337,7 +327,8 @@ class ScenarioGeneratorAPI:
         return {
             'LOC': {'lat': lat, 'lon': lon, 'radius': loc.get('search_radius_km', 1.0)},
             'SIM': {'vehs': vehs, 'dur': dur},
-            'DEV': {'offset': 15, 'len': 8}
+            'DEV': {'offset': 15, 'len': 8},
+            'OUT': {'edge_period': float(self.config.get('edge_data_period', 300)), 'detector_period': float(self.config.get('detector_period', 60))}
         }
 
     def _get_bbox(self, lat, lon, r):
@@ -384,8 +375,14 @@ class ScenarioGeneratorAPI:
             "-n", str(net), "-r", str(rou), "-o", str(out / "trips.xml"),
             "-e", str(self.settings['SIM']['dur']), "-p", "2.5", "--validate"
         ], check=True)
+        self._write_edge_data(out / "edge_data.add.xml")
+        # Métricas agregadas pelo próprio SUMO: tripinfo, edgeData e as saídas e2 (detectors.add.xml)
+        body = f"""<input><net-file value="{net.name}"/><route-files value="{rou.name}"/><additional-files value="detectors.add.xml,edge_data.add.xml"/></input><output><tripinfo-output value="tripinfo.xml"/></output><time><begin value="0"/><end value="{int(self.settings['SIM']['dur'])}"/></time>"""
         with open(out / "api.sumocfg", 'w') as f:
-            f.write(f"""<configuration><input><net-file value="{net.name}"/><route-files value="{rou.name}"/></input><time><begin value="0"/><end value="{int(self.settings['SIM']['dur'])}"/></time></configuration>""")
+            f.write(f"<configuration>{body}</configuration>")
+        # Variante mesoscópica (fidelity: meso): mesma rede e rotas, semáforos ainda controlam os cruzamentos
+        with open(out / "api.meso.sumocfg", 'w') as f:
+            f.write(f"""<configuration>{body}<mesoscopic><mesosim value="true"/><meso-junction-control value="true"/></mesoscopic></configuration>""")
 
     def _convert_trips_to_json(self, trips_xml, json_out):
         try:
@@ -408,9 +405,13 @@ class ScenarioGeneratorAPI:
         with open(fp, 'w') as f:
             f.write("<additional>\n")
             for d in self.detectors_config:
-                f.write(f' <e2Detector id="{d["id"]}" lane="{d["lane"]}" pos="{d["pos"]:.2f}" length="{d["len"]:.2f}" file="traffic.xml" freq="60"/>\n')
+                f.write(f' <e2Detector id="{d["id"]}" lane="{d["lane"]}" pos="{d["pos"]:.2f}" length="{d["len"]:.2f}" file="traffic.xml" freq="{self.settings["OUT"]["detector_period"]:g}"/>\n')
             f.write("</additional>")
 
+    def _write_edge_data(self, fp):
+        with open(fp, 'w') as f:
+            f.write(f'<additional>\n <edgeData id="edge_data" file="edge_data.xml" period="{self.settings["OUT"]["edge_period"]:g}" excludeEmpty="true"/>\n</additional>')
+
 # --- MENU INTERATIVO ---
 def interactive_config():
     print("\n" + "="*40)
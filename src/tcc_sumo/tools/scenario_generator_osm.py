@@ -68,7 +68,8 @@ class ScenarioGeneratorOSM:
         self.settings = {
             'LOC': {'lat': -23.5, 'lon': -46.6, 'radius': 2.0}, 
             'SIM': {'vehs': num_vehicles, 'dur': duration},
-            'DEV': {'offset': 15, 'len': 8}
+            'DEV': {'offset': 15, 'len': 8},
+            'OUT': {'edge_period': float(self.config.get('edge_data_period', 300)), 'detector_period': float(self.config.get('detector_period', 60))}
         }
         self._extract_center(osm_full)
         self._clean_xml(osm_full)
@@ -212,9 +213,13 @@ class ScenarioGeneratorOSM:
         with open(fp, 'w') as f:
             f.write("<additional>\n")
             for d in self.detectors_config:
-                f.write(f' <e2Detector id="{d["id"]}" lane="{d["lane"]}" pos="{d["pos"]:.2f}" length="{d["len"]:.2f}" file="traffic.xml" freq="60"/>\n')
+                f.write(f' <e2Detector id="{d["id"]}" lane="{d["lane"]}" pos="{d["pos"]:.2f}" length="{d["len"]:.2f}" file="traffic.xml" freq="{self.settings["OUT"]["detector_period"]:g}"/>\n')
             f.write("</additional>")
 
+    def _write_edge_data(self, fp):
+        with open(fp, 'w') as f:
+            f.write(f'<additional>\n <edgeData id="edge_data" file="edge_data.xml" period="{self.settings["OUT"]["edge_period"]:g}" excludeEmpty="true"/>\n</additional>')
+
     def _gen_web_map_offline(self, lat, lon, roads, fp):
         lines = []
         for r in roads:
@@ -295,15 +300,29 @@ map.fitBounds([[{lat-0.02},{lon-0.02}],[{lat+0.02},{lon+0.02}]]);
             "-n", str(net), "-r", str(rou), "-o", str(out / "trips.xml"),
             "-e", str(self.settings['SIM']['dur']), "-p", "2.5", "--validate"
         ], check=True)
-        with open(out / "osm.sumocfg", 'w') as f:
-            f.write(f"""<configuration>
+        self._write_edge_data(out / "edge_data.add.xml")
+        # Métricas agregadas pelo próprio SUMO: tripinfo, edgeData e as saídas e2 (detectors.add.xml)
+        body = f"""
             <input>
                 <net-file value="{net.name}"/>
                 <route-files value="{rou.name}"/>
-                <additional-files value="detectors.add.xml"/>
+                <additional-files value="detectors.add.xml,edge_data.add.xml"/>
                 <gui-settings-file value="gui-settings.xml"/>
             </input>
-            <time><begin value="0"/><end value="{int(self.settings['SIM']['dur'])}"/></time>
+            <output>
+                <tripinfo-output value="tripinfo.xml"/>
+            </output>
+            <time><begin value="0"/><end value="{int(self.settings['SIM']['dur'])}"/></time>"""
+        with open(out / "osm.sumocfg", 'w') as f:
+            f.write(f"""<configuration>{body}
+            </configuration>""")
+        # Variante mesoscópica (fidelity: meso): mesma rede e rotas, semáforos ainda controlam os cruzamentos
+        with open(out / "osm.meso.sumocfg", 'w') as f:
+            f.write(f"""<configuration>{body}
+            <mesoscopic>
+                <mesosim value="true"/>
+                <meso-junction-control value="true"/>
+            </mesoscopic>
             </configuration>""")
 
     def _update_cfg(self):
@@ -1,56 +1,110 @@
-import traci
 import random
-from typing import List
+import traci.constants as tc
+from typing import List, Optional
 from abc import ABC, abstractmethod
 from tcc_sumo.utils.helpers import get_logger
+from tcc_sumo.simulation.backend import traci
+from tcc_sumo.simulation.telemetry import SubscriptionHub
+from tcc_sumo.traffic_logic.topology import TopologyIndex, YELLOW, GREEN, RED
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    HAS_NUMPY = False
 
 logger = get_logger("TrafficController")
 
+# Duração do amarelo: 1 a 2 minutos
+YELLOW_MIN, YELLOW_MAX = 60, 120
+
+# Leitura de fila por domínio de sensor (variável de subscrição, getter); detectores e2 medem o congestionamento
+HALTING = (tc.LAST_STEP_VEHICLE_HALTING_NUMBER, 'getLastStepHaltingNumber')
+QUEUE_READINGS = {'lanearea': (tc.JAM_LENGTH_VEHICLE, 'getJamLengthVehicle')}
+OCCUPANCY = (tc.LAST_STEP_OCCUPANCY, 'getLastStepOccupancy')
+
 class BaseController(ABC):
     @abstractmethod
-    def setup(self, tl_ids: List[str]): pass
+    def setup(self, tl_ids: List[str], topology: Optional[TopologyIndex] = None, telemetry: Optional[SubscriptionHub] = None): pass
     @abstractmethod
-    def manage_traffic_lights(self, step: int): pass
+    def manage_traffic_lights(self, step: int, due: Optional[List[str]] = None): pass
+
+    def next_wakeup(self, tid: str, step: int) -> Optional[int]:
+        # Próximo passo em que o semáforo precisa ser avaliado (padrão: todo passo)
+        return step + 1
+
+    # Referências refeitas no setup: não entram no checkpoint
+    TRANSIENT = ('topology', 'telemetry')
+
+    # Semáforos desligados (dispositivo inativo/manutenção): fora das decisões até resume; trocado, nunca alterado no lugar
+    paused = frozenset()
+
+    def pause(self, tid: str):
+        self.paused = self.paused | {tid}
+
+    def resume(self, tid: str, step: int):
+        # Religado no passo 'step': o controlador retoma o semáforo a partir dali
+        self.paused = self.paused - {tid}
+
+    def get_state(self) -> dict:
+        return {k: v for k, v in vars(self).items() if k not in self.TRANSIENT}
+
+    def set_state(self, state: dict, step: int):
+        # Chamado após setup + loadState: o SUMO já está no passo 'step'
+        vars(self).update(state)
+
+    def rebase(self, step: int):
+        # Controlador novo partindo de um snapshot: os tempos passam a contar a partir de 'step'
+        for st in getattr(self, 'states', {}).values(): st['last_switch'] += step
 
 class StaticController(BaseController):
     def __init__(self):
         self.tls_ids = []
         self.states = {}
+        self.topology = None
+        self.rngs = {}
 
-    def setup(self, tl_ids: List[str]):
+    def setup(self, tl_ids: List[str], topology: Optional[TopologyIndex] = None, telemetry: Optional[SubscriptionHub] = None):
         self.tls_ids = tl_ids
+        self.topology = topology or TopologyIndex.build(tl_ids)
         logger.info("Modo Estático: Ciclos de Minutos (Dependência R/G).")
         
+        # Um gerador por semáforo (derivado do random global): o plano não depende da ordem de avaliação
+        base_seed = random.getrandbits(64)
         for tid in self.tls_ids:
             try:
-                logics = traci.trafficlight.getAllProgramLogics(tid)
-                if logics:
-                    # Tenta iniciar em fase vermelha para facilitar lógica
-                    start_phase = 0
-                    for i, p in enumerate(logics[0].phases):
-                        if 'r' in p.state.lower() and 'g' not in p.state.lower():
-                            start_phase = i
-                            break
-                    
-                    traci.trafficlight.setPhase(tid, start_phase)
-                    
-                    # Define um "último vermelho" inicial fictício (ex: 300s)
-                    last_red = 300
-                    curr_dur = self._calc_duration(logics[0].phases[start_phase], last_red)
-                    
-                    # Offset aleatório para dessincronizar
-                    offset = random.randint(0, 60)
-
-                    self.states[tid] = {
-                        'last_switch': -offset,
-                        'current_phase': start_phase,
-                        'current_duration': curr_dur + offset,
-                        'last_red_duration': last_red
-                    }
+                if self.topology[tid].phases:
+                    self.rngs[tid] = random.Random(f"{base_seed}:{tid}")
+                    self.states[tid] = self._initial_state(tid)
+                    traci.trafficlight.setPhase(tid, self.states[tid]['current_phase'])
             except: pass
 
-    def manage_traffic_lights(self, step: int):
-        for tid in self.tls_ids:
+    def _initial_state(self, tid):
+        topo = self.topology[tid]
+        # Tenta iniciar em fase vermelha para facilitar lógica
+        start_phase = 0
+        for i, red in enumerate(topo.full_red):
+            if red:
+                start_phase = i
+                break
+        
+        # Define um "último vermelho" inicial fictício (ex: 300s)
+        last_red = 300
+        curr_dur = self._calc_duration(tid, topo.colors[start_phase], last_red)
+        
+        # Offset aleatório para dessincronizar
+        offset = self.rngs[tid].randint(0, 60)
+
+        return {
+            'last_switch': -offset,
+            'current_phase': start_phase,
+            'current_duration': curr_dur + offset,
+            'last_red_duration': last_red
+        }
+
+    def manage_traffic_lights(self, step: int, due: Optional[List[str]] = None):
+        for tid in (self.tls_ids if due is None else due):
+            if tid in self.paused: continue
             try:
                 state = self.states[tid]
                 time_in_phase = step - state['last_switch']
@@ -59,87 +113,381 @@ class StaticController(BaseController):
                     self._switch_phase(tid, step, state)
             except: pass
 
+    def next_wakeup(self, tid: str, step: int) -> Optional[int]:
+        state = self.states.get(tid)
+        if not state: return None
+        return max(step + 1, state['last_switch'] + state['current_duration'])
+
+    def resume(self, tid: str, step: int):
+        super().resume(tid, step)
+        if tid not in self.states: return
+        # Recomeça o ciclo como no setup, deslocado para o passo da religação
+        state = self._initial_state(tid)
+        state['last_switch'] += step
+        self.states[tid] = state
+        traci.trafficlight.setPhase(tid, state['current_phase'])
+
     def _switch_phase(self, tid, step, state):
-        program = traci.trafficlight.getAllProgramLogics(tid)[0]
-        next_idx = (state['current_phase'] + 1) % len(program.phases)
+        next_idx = self._advance_state(tid, step, state)
         traci.trafficlight.setPhase(tid, next_idx)
+
+    def _advance_state(self, tid, step, state):
+        topo = self.topology[tid]
+        next_idx = (state['current_phase'] + 1) % len(topo.phases)
         
         # Se a fase que acabou era Vermelha, salva a duração real
-        prev_def = program.phases[state['current_phase']]
-        state_str = prev_def.state.lower()
-        if 'r' in state_str and 'g' not in state_str:
+        if topo.full_red[state['current_phase']]:
              duration = step - state['last_switch']
              if duration > 60: # Valida se foi um vermelho significativo
                 state['last_red_duration'] = duration
 
-        new_dur = self._calc_duration(program.phases[next_idx], state['last_red_duration'])
+        new_dur = self._calc_duration(tid, topo.colors[next_idx], state['last_red_duration'])
         
         state['last_switch'] = step
         state['current_phase'] = next_idx
         state['current_duration'] = new_dur
+        return next_idx
 
-    def _calc_duration(self, phase, last_red):
-        s = phase.state.lower()
+    def _calc_duration(self, tid, color, last_red):
+        rng = self.rngs[tid]
         # Amarelo: 1 a 2 minutos
-        if 'y' in s: return random.randint(60, 120)
+        if color == YELLOW: return rng.randint(YELLOW_MIN, YELLOW_MAX)
         # Verde: Vermelho Anterior + (2 a 3 minutos)
-        if 'g' in s: return last_red + random.randint(120, 180)
+        if color == GREEN: return last_red + rng.randint(120, 180)
         # Vermelho: 3 a 5 minutos
-        if 'r' in s: return random.randint(180, 300)
+        if color == RED: return rng.randint(180, 300)
         return 60
 
+    def plan(self, tid, state, horizon):
+        """Desenrola o plano a partir do estado: [(fase, início, duração)] em segundos desde o setup."""
+        entries = []
+        # A troca da iteração 'step' vale a partir do instante step + 1 (a iteração 0 produz o instante 1)
+        step = max(0, state['last_switch'] + state['current_duration'])
+        entries.append((state['current_phase'], 1, step))
+        while step + 1 < horizon:
+            idx = self._advance_state(tid, step, state)
+            entries.append((idx, step + 1, state['current_duration']))
+            step += state['current_duration']
+        return entries
+
+class NativeStaticController(StaticController):
+    """Compila o plano estático completo num programa SUMO (setProgramLogic): zero Python por passo."""
+
+    PROGRAM_ID = "tcc_static"
+
+    def __init__(self, horizon: int = 86400):
+        super().__init__()
+        self.horizon = horizon
+        self.plans = {}
+
+    def setup(self, tl_ids: List[str], topology: Optional[TopologyIndex] = None, telemetry: Optional[SubscriptionHub] = None):
+        self.tls_ids = tl_ids
+        self.topology = topology or TopologyIndex.build(tl_ids)
+        
+        base_seed = random.getrandbits(64)
+        for tid in self.tls_ids:
+            try:
+                if not self.topology[tid].phases: continue
+                self.rngs[tid] = random.Random(f"{base_seed}:{tid}")
+                self.plans[tid] = self.plan(tid, self._initial_state(tid), self.horizon)
+                self._install(tid, 0)
+            except Exception as e:
+                logger.warning(f"Falha ao instalar plano nativo em {tid}: {e}")
+        logger.info(f"Modo Estático (nativo): {len(self.plans)} programas instalados (horizonte {self.horizon}s).")
+
+    def _install(self, tid, step):
+        topo = self.topology[tid]
+        plan = self.plans[tid]
+        phases = [traci.trafficlight.Phase(dur, topo.phases[idx].state) for idx, _, dur in plan]
+        traci.trafficlight.setProgramLogic(tid, traci.trafficlight.Logic(self.PROGRAM_ID, 0, 0, phases))
+        traci.trafficlight.setProgram(tid, self.PROGRAM_ID)
+        # Posiciona o programa na entrada que cobre o instante step + 1 (retomada de checkpoint)
+        t = step + 1
+        for i, (_, start, dur) in enumerate(plan):
+            if start <= t < start + dur:
+                if i or start != t:
+                    traci.trafficlight.setPhase(tid, i)
+                    traci.trafficlight.setPhaseDuration(tid, start + dur - t)
+                break
+
+    def set_state(self, state: dict, step: int):
+        super().set_state(state, step)
+        for tid in self.plans:
+            if tid in self.paused: continue
+            try: self._install(tid, step)
+            except Exception as e: logger.warning(f"Falha ao reinstalar plano nativo em {tid}: {e}")
+
+    def rebase(self, step: int):
+        # O programa instalado no setup já começa no instante atual; só o plano de referência é deslocado
+        self.plans = {tid: [(idx, start + step, dur) for idx, start, dur in plan] for tid, plan in self.plans.items()}
+
+    def resume(self, tid: str, step: int):
+        BaseController.resume(self, tid, step)
+        # Reinstala o plano posicionado no instante atual: o semáforo volta alinhado ao plano de referência
+        if tid in self.plans: self._install(tid, step)
+
+    def manage_traffic_lights(self, step: int, due: Optional[List[str]] = None): pass
+
+    def next_wakeup(self, tid: str, step: int) -> Optional[int]:
+        return None
+
+    def expected_state(self, tid, step):
+        # Estado que o plano em Python teria na iteração 'step' (instante step + 1)
+        t = step + 1
+        topo = self.topology[tid]
+        for idx, start, dur in self.plans[tid]:
+            if start <= t < start + dur: return topo.phases[idx].state
+        return None
+
+    def verify(self, step):
+        mismatches = []
+        for tid in self.plans:
+            if tid in self.paused: continue
+            expected = self.expected_state(tid, step)
+            if expected is None: continue
+            actual = traci.trafficlight.getRedYellowGreenState(tid)
+            if actual != expected: mismatches.append(tid)
+        return mismatches
+
 class AdaptiveController(BaseController):
-    def __init__(self, threshold: int = 3, min_time: int = 60, max_time: int = 600):
+    def __init__(self, threshold: int = 3, min_time: int = 60, max_time: int = 600, sense: str = 'lane',
+                 occupancy_threshold: Optional[float] = None, detector_threshold: Optional[int] = None):
         self.tls_ids = []
         self.states = {}
         self.THRESHOLD = threshold
         self.MIN_TIME = min_time
         self.MAX_TIME = max_time
+        # 'lane' (microscópico), 'edge' (mesoscópico) ou 'lanearea' (detectores e2): domínio TraCI de onde vem a fila
+        self.sense = sense
+        # Só com detectores: ocupação (%) de uma aproximação que já justifica a troca, mesmo abaixo de THRESHOLD
+        self.OCCUPANCY = occupancy_threshold
+        # Fila (veículos) que aciona a troca nos semáforos lidos por detectores: um e2 de poucos metros comporta
+        # só um ou dois veículos, então THRESHOLD (pensado para a faixa inteira) raramente seria atingido
+        self.DETECTOR_THRESHOLD = threshold if detector_threshold is None else detector_threshold
+        self.topology = None
+        self.telemetry = None
 
-    def setup(self, tl_ids: List[str]):
+    def setup(self, tl_ids: List[str], topology: Optional[TopologyIndex] = None, telemetry: Optional[SubscriptionHub] = None):
         self.tls_ids = tl_ids
+        self.topology = topology or TopologyIndex.build(tl_ids)
         for tid in self.tls_ids:
             self.states[tid] = {'last_switch': 0, 'yellow_duration': 0}
+        self._setup_sensing(self.tls_ids)
+        # Detectores: uma subscrição em lote para todos, lida a cada passo pelo SubscriptionHub
+        if self.sense == 'lanearea' and telemetry is not None:
+            self.telemetry = telemetry
+            self._require_sensors()
         logger.info("Modo Adaptativo: Sincronização Global Ativa.")
 
-    def manage_traffic_lights(self, step: int):
-        for tid in self.tls_ids:
+    def _setup_sensing(self, tl_ids):
+        # Domínio lido por semáforo: com 'lanearea', os que não têm detector e2 leem as faixas inteiras
+        self.domains = {}
+        for tid in tl_ids:
+            if tid not in self.topology: continue
+            self.domains[tid] = 'lane' if self.sense == 'lanearea' and not self.topology[tid].detectors else self.sense
+        fallback = sum(1 for d in self.domains.values() if d != self.sense)
+        if fallback: logger.warning(f"{fallback} de {len(self.domains)} semáforos sem detector e2: usando as faixas inteiras.")
+
+    def _require_sensors(self):
+        by_domain = {}
+        for tid, domain in self.domains.items(): by_domain.setdefault(domain, set()).update(self.topology[tid].sensors(domain))
+        for domain, ids in by_domain.items(): self.telemetry.require(domain, sorted(ids), self.sensor_vars(domain))
+
+    def sensor_vars(self, domain):
+        return [QUEUE_READINGS.get(domain, HALTING)[0]] + ([OCCUPANCY[0]] if self._reads_occupancy(domain) else [])
+
+    def _threshold(self, tid):
+        return self.DETECTOR_THRESHOLD if self.domains.get(tid) == 'lanearea' else self.THRESHOLD
+
+    def _reads_occupancy(self, domain):
+        return domain == 'lanearea' and self.OCCUPANCY is not None
+
+    def manage_traffic_lights(self, step: int, due: Optional[List[str]] = None):
+        for tid in (self.tls_ids if due is None else due):
+            if tid in self.paused: continue
             try: self._evaluate(tid, step)
             except: pass
 
+    def resume(self, tid: str, step: int):
+        super().resume(tid, step)
+        if tid in self.states: self.states[tid] = {'last_switch': step, 'yellow_duration': 0}
+
+    def next_wakeup(self, tid: str, step: int) -> Optional[int]:
+        state = self.states.get(tid)
+        if not state: return None
+        return self._earliest_decision(state['last_switch'], state['yellow_duration'], step)
+
+    def _earliest_decision(self, last_switch, yellow_duration, step):
+        # Nenhuma troca é possível antes do amarelo sorteado ou de MIN_TIME (o amarelo dura ao menos YELLOW_MIN)
+        if yellow_duration: return max(step + 1, int(last_switch + yellow_duration))
+        return max(step + 1, int(last_switch) + min(self.MIN_TIME + 1, YELLOW_MIN))
+
     def _evaluate(self, tid, step):
         current_idx = traci.trafficlight.getPhase(tid)
-        program = traci.trafficlight.getAllProgramLogics(tid)[0]
-        phase_def = program.phases[current_idx]
-        state_str = phase_def.state.lower()
+        topo = self.topology[tid]
         
         last_switch = self.states[tid]['last_switch']
         time_in_phase = step - last_switch
         
         # Lógica Amarelo (1 a 2 min)
-        if 'y' in state_str:
+        if topo.colors[current_idx] == YELLOW:
             if self.states[tid]['yellow_duration'] == 0:
-                self.states[tid]['yellow_duration'] = random.randint(60, 120)
+                self.states[tid]['yellow_duration'] = random.randint(YELLOW_MIN, YELLOW_MAX)
             
             if time_in_phase >= self.states[tid]['yellow_duration']:
-                self._advance(tid, step, current_idx, program)
+                self._advance(tid, step, current_idx, topo)
             return
 
         # Lógica Verde/Vermelho (Demanda Total)
-        total_queue = 0
-        links = traci.trafficlight.getControlledLinks(tid)
-        unique_lanes = set(l[0] for group in links for l in group if l)
-        for l in unique_lanes: total_queue += traci.lane.getLastStepHaltingNumber(l)
+        total_queue, max_occupancy = self._read_demand(tid, topo)
 
         should_switch = False
-        if total_queue >= self.THRESHOLD and time_in_phase > self.MIN_TIME: should_switch = True
+        demand = total_queue >= self._threshold(tid) or (max_occupancy is not None and max_occupancy >= self.OCCUPANCY)
+        if demand and time_in_phase > self.MIN_TIME: should_switch = True
         if time_in_phase > self.MAX_TIME: should_switch = True
 
         if should_switch:
-            self._advance(tid, step, current_idx, program)
+            self._advance(tid, step, current_idx, topo)
 
-    def _advance(self, tid, step, idx, program):
-        next_idx = (idx + 1) % len(program.phases)
+    def _read_demand(self, tid, topo):
+        # Fila somada e maior ocupação entre as aproximações do semáforo (None se a ocupação não é usada)
+        domain = self.domains.get(tid, self.sense)
+        queue_var, queue_getter = QUEUE_READINGS.get(domain, HALTING)
+        read_occupancy = self._reads_occupancy(domain)
+        total_queue, max_occupancy = 0, (0.0 if read_occupancy else None)
+        if self.telemetry is not None:
+            res = self.telemetry.domain(domain)
+            for s in topo.sensors(domain):
+                r = res.get(s)
+                if not r: continue
+                total_queue += r[queue_var]
+                if read_occupancy: max_occupancy = max(max_occupancy, r[OCCUPANCY[0]])
+            return total_queue, max_occupancy
+        api = getattr(traci, domain)
+        get_queue = getattr(api, queue_getter)
+        for s in topo.sensors(domain):
+            total_queue += get_queue(s)
+            if read_occupancy: max_occupancy = max(max_occupancy, api.getLastStepOccupancy(s))
+        return total_queue, max_occupancy
+
+    def _advance(self, tid, step, idx, topo):
+        next_idx = (idx + 1) % len(topo.phases)
         traci.trafficlight.setPhase(tid, next_idx)
         self.states[tid]['last_switch'] = step
-        self.states[tid]['yellow_duration'] = 0
\ No newline at end of file
+        self.states[tid]['yellow_duration'] = 0
+
+class VectorizedAdaptiveController(AdaptiveController):
+    """Mesma regra do AdaptiveController, decidida em lote com NumPy para todos os semáforos de uma vez."""
+
+    def setup(self, tl_ids: List[str], topology: Optional[TopologyIndex] = None, telemetry: Optional[SubscriptionHub] = None):
+        self.topology = topology or TopologyIndex.build(tl_ids)
+        self.telemetry = telemetry
+        self.tls_ids = [tid for tid in tl_ids if tid in self.topology and self.topology[tid].phases]
+        n = len(self.tls_ids)
+        self._setup_sensing(self.tls_ids)
+
+        # Sensores como (domínio, id): detectores e, nos semáforos sem detector, faixas inteiras
+        self.sensor_keys = sorted({(self.domains[tid], s) for tid in self.tls_ids for s in self.topology[tid].sensors(self.domains[tid])})
+        sensor_idx = {k: i for i, k in enumerate(self.sensor_keys)}
+        self.sensor_groups = {}
+        for i, (domain, sid) in enumerate(self.sensor_keys):
+            ids, idx = self.sensor_groups.setdefault(domain, ([], []))
+            ids.append(sid)
+            idx.append(i)
+        self.sensor_groups = {d: (ids, np.array(idx, dtype=np.int64)) for d, (ids, idx) in self.sensor_groups.items()}
+
+        # Matriz de incidência sensor->semáforo em formato COO (pares sensor, semáforo)
+        pairs = [(sensor_idx[(self.domains[tid], s)], i) for i, tid in enumerate(self.tls_ids) for s in self.topology[tid].sensors(self.domains[tid])]
+        self.pair_sensor = np.array([p[0] for p in pairs], dtype=np.int64)
+        self.pair_tls = np.array([p[1] for p in pairs], dtype=np.int64)
+
+        # Tabela achatada de fases: offset[i] + fase -> é amarelo?
+        self.n_phases = np.array([len(self.topology[tid].phases) for tid in self.tls_ids], dtype=np.int64)
+        self.phase_offset = np.concatenate(([0], np.cumsum(self.n_phases)[:-1])).astype(np.int64) if n else np.zeros(0, dtype=np.int64)
+        self.yellow_table = np.array([c == YELLOW for tid in self.tls_ids for c in self.topology[tid].colors], dtype=bool)
+
+        self.index = {tid: i for i, tid in enumerate(self.tls_ids)}
+        self.last_switch = np.zeros(n, dtype=np.int64)
+        self.yellow_duration = np.zeros(n, dtype=np.int64)
+        self.paused_mask = np.zeros(n, dtype=bool)
+        self.thresholds = np.array([self._threshold(tid) for tid in self.tls_ids], dtype=np.float64)
+
+        if self.telemetry is not None:
+            self._require_sensors()
+            self.telemetry.require('trafficlight', self.tls_ids, [tc.TL_CURRENT_PHASE])
+        counts = ", ".join(f"{len(ids)} ({d})" for d, (ids, _) in self.sensor_groups.items())
+        logger.info(f"Modo Adaptativo (vetorizado): {n} semáforos, sensores: {counts or 'nenhum'}.")
+
+    def rebase(self, step: int):
+        self.last_switch += step
+
+    def pause(self, tid: str):
+        super().pause(tid)
+        i = self.index.get(tid)
+        if i is not None: self.paused_mask[i] = True
+
+    def resume(self, tid: str, step: int):
+        BaseController.resume(self, tid, step)
+        i = self.index.get(tid)
+        if i is None: return
+        self.paused_mask[i] = False
+        self.last_switch[i] = step
+        self.yellow_duration[i] = 0
+
+    def _read_phases(self):
+        if self.telemetry is not None:
+            res = self.telemetry.domain('trafficlight')
+            return np.fromiter((res.get(tid, {}).get(tc.TL_CURRENT_PHASE, 0) for tid in self.tls_ids), dtype=np.int64, count=len(self.tls_ids))
+        return np.fromiter((traci.trafficlight.getPhase(tid) for tid in self.tls_ids), dtype=np.int64, count=len(self.tls_ids))
+
+    def _read_sensors(self, reading):
+        # reading(domínio) -> (variável, getter), ou None para deixar o domínio em zero
+        out = np.zeros(len(self.sensor_keys))
+        for domain, (ids, idx) in self.sensor_groups.items():
+            r = reading(domain)
+            if r is None: continue
+            var, getter = r
+            if self.telemetry is not None:
+                res = self.telemetry.domain(domain)
+                out[idx] = np.fromiter((res.get(s, {}).get(var, 0) for s in ids), dtype=np.float64, count=len(ids))
+            else:
+                get = getattr(getattr(traci, domain), getter)
+                out[idx] = np.fromiter((get(s) for s in ids), dtype=np.float64, count=len(ids))
+        return out
+
+    def next_wakeup(self, tid: str, step: int) -> Optional[int]:
+        i = self.index.get(tid)
+        if i is None: return None
+        return self._earliest_decision(self.last_switch[i], self.yellow_duration[i], step)
+
+    def manage_traffic_lights(self, step: int, due: Optional[List[str]] = None):
+        # Avalia sempre o lote inteiro: avaliar antes do despertar não altera decisões
+        if not self.tls_ids: return
+        phases = self._read_phases()
+        phases = np.minimum(phases, self.n_phases - 1)
+        time_in_phase = step - self.last_switch
+        is_yellow = self.yellow_table[self.phase_offset + phases]
+
+        # Sorteio da duração do amarelo na ordem dos semáforos (mesma sequência do modo escalar)
+        new_yellow = np.flatnonzero(is_yellow & (self.yellow_duration == 0) & ~self.paused_mask)
+        for i in new_yellow: self.yellow_duration[i] = random.randint(YELLOW_MIN, YELLOW_MAX)
+
+        queue_reading = lambda d: QUEUE_READINGS.get(d, HALTING)
+        queues = np.bincount(self.pair_tls, weights=self._read_sensors(queue_reading)[self.pair_sensor], minlength=len(self.tls_ids))
+        demand = queues >= self.thresholds
+        if 'lanearea' in self.sensor_groups and self.OCCUPANCY is not None:
+            occupancy = np.zeros(len(self.tls_ids))
+            np.maximum.at(occupancy, self.pair_tls, self._read_sensors(lambda d: OCCUPANCY if self._reads_occupancy(d) else None)[self.pair_sensor])
+            demand |= occupancy >= self.OCCUPANCY
+
+        switch_yellow = is_yellow & (time_in_phase >= self.yellow_duration)
+        switch_demand = ~is_yellow & ((demand & (time_in_phase > self.MIN_TIME)) | (time_in_phase > self.MAX_TIME))
+        switching = np.flatnonzero((switch_yellow | switch_demand) & ~self.paused_mask)
+        if not len(switching): return
+
+        next_phase = (phases[switching] + 1) % self.n_phases[switching]
+        for i, nxt in zip(switching, next_phase):
+            try: traci.trafficlight.setPhase(self.tls_ids[i], int(nxt))
+            except: pass
+        self.last_switch[switching] = step
+        self.yellow_duration[switching] = 0
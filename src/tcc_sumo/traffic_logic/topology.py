@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from types import MappingProxyType
+from typing import Dict, Iterable, NamedTuple, Tuple
+
+from tcc_sumo.utils.helpers import get_logger
+from tcc_sumo.simulation.backend import traci
+from tcc_sumo.simulation.native_outputs import STATS_PREFIX
+
+logger = get_logger("Topology")
+
+# Classes de cor das fases (precedência: amarelo > verde > vermelho)
+YELLOW, GREEN, RED, OTHER = 'y', 'g', 'r', '-'
+
+def classify_phase(state: str) -> str:
+    s = state.lower()
+    if 'y' in s: return YELLOW
+    if 'g' in s: return GREEN
+    if 'r' in s: return RED
+    return OTHER
+
+def is_full_red(state: str) -> bool:
+    s = state.lower()
+    return 'r' in s and 'g' not in s
+
+class TlsTopology(NamedTuple):
+    tls_id: str
+    lanes: Tuple[str, ...]
+    phases: Tuple
+    colors: Tuple[str, ...]
+    full_red: Tuple[bool, ...]
+    edges: Tuple[str, ...] = ()
+    detectors: Tuple[str, ...] = ()
+
+    def sensors(self, domain: str = 'lane') -> Tuple[str, ...]:
+        # Mesoscópico só mantém dados por aresta/segmento: 'edge' troca as faixas pelas arestas de chegada;
+        # 'lanearea' usa os detectores e2 posicionados antes da linha de retenção (como as câmeras)
+        if domain == 'edge': return self.edges
+        if domain == 'lanearea': return self.detectors
+        return self.lanes
+
+class TopologyIndex:
+    """Índice imutável da topologia dos semáforos, construído uma vez logo após o traci.start."""
+
+    def __init__(self, tls: Dict[str, TlsTopology]):
+        self._tls = MappingProxyType(dict(tls))
+        lane_map = {}
+        for tid, topo in self._tls.items():
+            for lane in topo.lanes: lane_map.setdefault(lane, []).append(tid)
+        self.lane_to_tls = MappingProxyType({l: tuple(ts) for l, ts in lane_map.items()})
+
+    @classmethod
+    def build(cls, tls_ids: Iterable[str]) -> "TopologyIndex":
+        tls = {}
+        for tid in tls_ids:
+            try:
+                lanes = tuple(dict.fromkeys(traci.trafficlight.getControlledLanes(tid)))
+                edges = tuple(dict.fromkeys(traci.lane.getEdgeID(l) for l in lanes))
+                logics = traci.trafficlight.getAllProgramLogics(tid)
+                phases = tuple(logics[0].phases) if logics else ()
+            except Exception as e:
+                logger.warning(f"Topologia indisponível para {tid}: {e}")
+                continue
+            tls[tid] = TlsTopology(
+                tls_id=tid,
+                lanes=lanes,
+                phases=phases,
+                colors=tuple(classify_phase(p.state) for p in phases),
+                full_red=tuple(is_full_red(p.state) for p in phases),
+                edges=edges
+            )
+        tls = cls._attach_detectors(tls)
+        logger.info(f"Topologia indexada: {len(tls)} semáforos.")
+        return cls(tls)
+
+    @staticmethod
+    def _attach_detectors(tls: Dict[str, TlsTopology]) -> Dict[str, TlsTopology]:
+        # Detectores e2 do cenário (detectors.add.xml) associados pela faixa em que estão
+        try:
+            det_lanes = {d: traci.lanearea.getLaneID(d) for d in traci.lanearea.getIDList() if not d.startswith(STATS_PREFIX)}
+        except Exception as e:
+            logger.warning(f"Detectores e2 indisponíveis: {e}")
+            return tls
+        by_lane = {}
+        for det, lane in det_lanes.items(): by_lane.setdefault(lane, []).append(det)
+        return {tid: topo._replace(detectors=tuple(d for l in topo.lanes for d in by_lane.get(l, ())))
+                for tid, topo in tls.items()}
+
+    def __getitem__(self, tid: str) -> TlsTopology:
+        return self._tls[tid]
+
+    def __contains__(self, tid) -> bool:
+        return tid in self._tls
+
+    def __iter__(self):
+        return iter(self._tls)
+
+    def __len__(self) -> int:
+        return len(self._tls)
+
+    def get(self, tid: str, default=None):
+        return self._tls.get(tid, default)
@@ -0,0 +1,22 @@
+-- Cursor do sync por delta (DeviceRegistry): toda linha de 'dispositivos' tem updated_at,
+-- renovado pelo banco em qualquer alteração (sync_db, painel, SQL manual).
+
+alter table public.dispositivos
+    add column if not exists updated_at timestamptz not null default now();
+
+create index if not exists dispositivos_updated_at_idx on public.dispositivos (updated_at);
+
+create or replace function public.dispositivos_touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    new.updated_at = now();
+    return new;
+end;
+$$;
+
+drop trigger if exists dispositivos_touch_updated_at on public.dispositivos;
+create trigger dispositivos_touch_updated_at
+    before update on public.dispositivos
+    for each row execute function public.dispositivos_touch_updated_at();
@@ -0,0 +1,17 @@
+-- Remoções visíveis no sync por delta: sync_db marca deleted_at (tombstone) em vez de apagar a linha,
+-- e o trigger só renova updated_at quando a linha muda de fato (o upsert do manifesto inteiro não vira delta).
+
+alter table public.dispositivos
+    add column if not exists deleted_at timestamptz;
+
+create or replace function public.dispositivos_touch_updated_at()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new is distinct from old then
+        new.updated_at = now();
+    end if;
+    return new;
+end;
+$$;